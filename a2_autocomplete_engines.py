@@ -14,19 +14,32 @@ testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
 """
 from __future__ import annotations
+import bisect
+import collections
+import concurrent.futures
 import csv
+import gzip
+import io
+import itertools
+import os
+import re
 import time
-from typing import Any
-from python_ta.contracts import check_contracts
+from array import array
+from collections.abc import Callable, Collection, Iterable, Iterator, Sequence
+from string import ascii_lowercase, ascii_uppercase
+from typing import Any, BinaryIO, NamedTuple, cast
 
-from a2_melody import Melody
-from a2_prefix_tree import Autocompleter, SimplePrefixTree, CompressedPrefixTree
+from a2_melody import Melody, CompactMelody, MelodyPlayer
+from a2_prefix_tree import (
+    Autocompleter, AutocompleteCursor, SimplePrefixTree, CompressedPrefixTree, ValueCodec,
+    check_contracts_if_enabled, pack_sections, unpack_sections
+)
 
 
 ################################################################################
 # Text-based Autocomplete Engines (Task 4)
 ################################################################################
-@check_contracts
+@check_contracts_if_enabled
 class LetterAutocompleteEngine:
     """An autocomplete engine that suggests strings based on a few letters.
 
@@ -40,15 +53,32 @@ class LetterAutocompleteEngine:
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
     """
+    # Private Instance Attributes:
+    # - _query_cache: The results of recent calls to autocomplete.
     autocompleter: Autocompleter
+    _query_cache: _QueryCache
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
 
         <config> is a dictionary consisting of the following keys:
-        - 'file': the path to a text file
+        - 'file': the path to a text file (which may be gzip-compressed), or an
+          open file or other iterable of the lines of a text file
         - 'autocompleter': either the string 'simple' or 'compressed',
           specifying which subclass of Autocompleter to use.
+        - 'cache_size' (optional): the number of top matches the Autocompleter
+          caches for each prefix it is asked to autocomplete (see
+          SimplePrefixTree.__init__). The default is 0, which caches nothing.
+        - 'query_cache_size' (optional): the number of recent autocomplete
+          results this engine keeps, keyed by the arguments to autocomplete
+          (see _QueryCache). The default is 0, which keeps none.
+        - 'query_cache_ttl' (optional): the number of seconds a kept result may
+          be reused for. The default is None, which reuses results until the
+          Autocompleter changes.
+        - 'workers' (optional): the number of processes used to read the file,
+          if it is the path to an uncompressed file. Each process reads and
+          sanitizes its own range of lines, and the results are combined into
+          one Autocompleter. The default is 1.
 
         Each line of the specified file counts as one input string.
         Note that the line may or may not contain spaces.
@@ -66,17 +96,16 @@ class LetterAutocompleteEngine:
         Preconditions:
         - config['file'] is a valid path to a file as described above
         - config['autocompleter'] in ['simple', 'compressed']
+        - config.get('workers', 1) >= 1
+        - config.get('query_cache_size', 0) >= 0
+        - config.get('query_cache_ttl') is None or config['query_cache_ttl'] > 0
         """
-        ...
+        self.autocompleter = _new_autocompleter(config)
+        self._query_cache = _new_query_cache(config)
+        self.autocompleter.bulk_load(_load_entries(config, _letter_entries))
 
-        # We've opened the file for you here. You should iterate over the
-        # lines of the file and process them according to the description in
-        # this method's docstring.
-        with open(config['file'], encoding='utf8') as f:
-            for line in f:
-                ...
-
-    def autocomplete(self, prefix: str, limit: int | None = None) -> list[tuple[str, float]]:
+    def autocomplete(self, prefix: str, limit: int | None = None,
+                     max_distance: int = 0) -> list[tuple[str, float]]:
         """Return up to <limit> matches for the given prefix string.
 
         The return value is a list of tuples (string, weight), and must be
@@ -84,13 +113,36 @@ class LetterAutocompleteEngine:
 
         If limit is None, return *every* match for the given prefix.
 
+        If max_distance > 0, the matches are the strings that start with a
+        string within that many single-character edits of <prefix> (see
+        Autocompleter.fuzzy_autocomplete), so that typos are tolerated.
+
         Note that the given prefix string must be transformed into a list
         of characters before being passed to the Autocompleter.
 
         Preconditions:
         - limit is None or limit > 0
+        - max_distance >= 0
         - <prefix> is a sanitized string
         """
+        if max_distance > 0:
+            return self._query_cache.get(
+                self.autocompleter, (prefix, limit, max_distance),
+                lambda: self.autocompleter.fuzzy_autocomplete(list(prefix), max_distance, limit))
+        return self._query_cache.get(
+            self.autocompleter, (prefix, limit, 0),
+            lambda: self.autocompleter.autocomplete(list(prefix), limit))
+
+    def begin(self) -> AutocompleteCursor:
+        """Return a new session for autocompleting a string as it is typed.
+
+        session.push(char) types one more character, session.pop() deletes the
+        last one, and session.autocomplete(limit) returns the matches for the
+        characters typed so far, as autocomplete does. Each push or pop only
+        moves the session one step through the Autocompleter, instead of
+        walking down from its root again for the whole prefix.
+        """
+        return self.autocompleter.cursor()
 
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix string.
@@ -101,9 +153,22 @@ class LetterAutocompleteEngine:
         Preconditions:
         - <prefix> is a sanitized string
         """
+        self.autocompleter.remove(list(prefix))
 
+    def cache_info(self) -> QueryCacheInfo:
+        """Return the hits, misses, maximum size and current size of this
+        engine's cache of autocomplete results.
+        """
+        return self._query_cache.info()
+
+    def cache_clear(self) -> None:
+        """Empty this engine's cache of autocomplete results and reset its
+        hit and miss counts.
+        """
+        self._query_cache.clear()
 
-@check_contracts
+
+@check_contracts_if_enabled
 class SentenceAutocompleteEngine:
     """An autocomplete engine that suggests strings based on a few words.
 
@@ -118,22 +183,43 @@ class SentenceAutocompleteEngine:
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
     """
+    # Private Instance Attributes:
+    # - _query_cache: The results of recent calls to autocomplete.
     autocompleter: Autocompleter
+    _query_cache: _QueryCache
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
 
         <config> is a dictionary consisting of the following keys:
-        - 'file': the path to a CSV file
+        - 'file': the path to a CSV file (which may be gzip-compressed), or an
+          open file or other iterable of the lines of a CSV file
         - 'autocompleter': either the string 'simple' or 'compressed',
           specifying which subclass of Autocompleter to use.
+        - 'cache_size' (optional): the number of top matches the Autocompleter
+          caches for each prefix it is asked to autocomplete (see
+          SimplePrefixTree.__init__). The default is 0, which caches nothing.
+        - 'query_cache_size' (optional): the number of recent autocomplete
+          results this engine keeps, keyed by the arguments to autocomplete
+          (see _QueryCache). The default is 0, which keeps none.
+        - 'query_cache_ttl' (optional): the number of seconds a kept result may
+          be reused for. The default is None, which reuses results until the
+          Autocompleter changes.
+        - 'workers' (optional): the number of processes used to read the file,
+          if it is the path to an uncompressed file. Each process reads and
+          sanitizes its own range of lines, and the results are combined into
+          one Autocompleter. The default is 1.
 
         Preconditions:
-        - config['file'] is the path to a *CSV file* where each line has two entries:
+        - config['file'] is a *CSV file* where each line has two entries:
             - the first entry is a string, which is the value to store in the Autocompleter
             - the second entry is the a positive float representing the weight of that
               string
         - config['autocompleter'] in ['simple', 'compressed']
+        - config.get('workers', 1) >= 1
+        - if config.get('workers', 1) > 1, no entry of the CSV file contains a newline
+        - config.get('query_cache_size', 0) >= 0
+        - config.get('query_cache_ttl') is None or config['query_cache_ttl'] > 0
 
         Note that the line may or may not contain spaces.
         Each string must be sanitized, and if the resulting string contains
@@ -145,8 +231,10 @@ class SentenceAutocompleteEngine:
         one line of the input file; this results in that string receiving
         the sum of the specified weights from each line.
         """
-        # We haven't given you any starter code here! You should review how
-        # you processed CSV files on Assignment 1.
+        self.autocompleter = _new_autocompleter(config)
+        self._query_cache = _new_query_cache(config)
+
+        self.autocompleter.bulk_load(_load_entries(config, _sentence_entries))
 
     def autocomplete(self, prefix: str, limit: int | None = None) -> list[tuple[str, float]]:
         """Return up to <limit> matches for the given prefix string.
@@ -163,6 +251,20 @@ class SentenceAutocompleteEngine:
         - limit is None or limit > 0
         - <prefix> is a sanitized string
         """
+        return self._query_cache.get(
+            self.autocompleter, (prefix, limit),
+            lambda: self.autocompleter.autocomplete(prefix.split(), limit))
+
+    def begin(self) -> AutocompleteCursor:
+        """Return a new session for autocompleting a sentence as it is typed.
+
+        session.push(word) types one more word, session.pop() deletes the
+        last one, and session.autocomplete(limit) returns the matches for the
+        words typed so far, as autocomplete does. Each push or pop only moves
+        the session one step through the Autocompleter, instead of walking
+        down from its root again for the whole prefix.
+        """
+        return self.autocompleter.cursor()
 
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix.
@@ -173,42 +275,91 @@ class SentenceAutocompleteEngine:
         Preconditions:
         - <prefix> is a sanitized string
         """
+        self.autocompleter.remove(prefix.split())
+
+    def cache_info(self) -> QueryCacheInfo:
+        """Return the hits, misses, maximum size and current size of this
+        engine's cache of autocomplete results.
+        """
+        return self._query_cache.info()
+
+    def cache_clear(self) -> None:
+        """Empty this engine's cache of autocomplete results and reset its
+        hit and miss counts.
+        """
+        self._query_cache.clear()
 
 
 ################################################################################
 # Melody-based Autocomplete Engines (Task 5)
 ################################################################################
-@check_contracts
+@check_contracts_if_enabled
 class MelodyAutocompleteEngine:
     """An autocomplete engine that suggests melodies based on a few intervals.
 
     The values stored are Melody objects, and the corresponding
-    prefix sequence for a Melody is its interval sequence.
+    prefix sequence for a Melody is its interval sequence. (The melodies are
+    CompactMelody objects, which keep their notes in typed arrays.)
 
     Because the prefix is based only on interval sequence and not the
     starting pitch or duration of the notes, it is possible for different
     melodies to have the same prefix.
 
+    Besides autocompleting interval sequences, the engine can search for
+    melodies whose interval sequence contains a fragment anywhere, using an
+    index of the short runs of intervals (n-grams) in each melody.
+
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
     """
+    # Private Instance Attributes:
+    # - _query_cache: The results of recent calls to autocomplete.
+    # - _melodies:
+    #     Maps the id of each melody stored in this engine to the melody. Ids
+    #     are numbered in the order the melodies were added, from 0.
+    # - _ids:
+    #     Maps each melody stored in this engine to its id.
+    # - _next_id:
+    #     The id of the next melody to be added (ids are never reused).
+    # - _fragments:
+    #     Maps every run of 1 to _FRAGMENT_LENGTH consecutive intervals in a
+    #     melody stored in this engine to the ids of the melodies containing
+    #     it, in increasing order. Runs that no stored melody contains are
+    #     not keys.
     autocompleter: Autocompleter
+    _query_cache: _QueryCache
+    _melodies: dict[int, CompactMelody]
+    _ids: dict[CompactMelody, int]
+    _next_id: int
+    _fragments: dict[tuple[int, ...], list[int]]
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
 
         <config> is a dictionary consisting of the following keys:
-        - 'file': the path to a CSV file
+        - 'file': the path to a CSV file (which may be gzip-compressed), or an
+          open file or other iterable of the lines of a CSV file
         - 'autocompleter': either the string 'simple' or 'compressed',
           specifying which subclass of Autocompleter to use.
+        - 'cache_size' (optional): the number of top matches the Autocompleter
+          caches for each prefix it is asked to autocomplete (see
+          SimplePrefixTree.__init__). The default is 0, which caches nothing.
+        - 'query_cache_size' (optional): the number of recent autocomplete
+          results this engine keeps, keyed by the arguments to autocomplete
+          (see _QueryCache). The default is 0, which keeps none.
+        - 'query_cache_ttl' (optional): the number of seconds a kept result may
+          be reused for. The default is None, which reuses results until the
+          Autocompleter changes.
 
         Preconditions:
-        - config['file'] is the path to a *CSV file* where each line has the following format:
+        - config['file'] is a *CSV file* where each line has the following format:
             - The first entry is the name of a melody (a string).
             - The remaining entries are grouped into pairs of integers (as in Assignment 1)
               where the first number in each pair is a note pitch,
               and the second number is the corresponding duration.
         - config['autocompleter'] in ['simple', 'compressed']
+        - config.get('query_cache_size', 0) >= 0
+        - config.get('query_cache_ttl') is None or config['query_cache_ttl'] > 0
 
         HOWEVER, there may be blank entries (stored as an empty string '').
         As soon as you encounter a blank entry, stop processing this line
@@ -216,8 +367,28 @@ class MelodyAutocompleteEngine:
 
         Each melody is inserted into the Autocompleter with a weight of 1.0.
         """
-        # We haven't given you any starter code here! You should review how
-        # you processed CSV files on Assignment 1.
+        self.autocompleter = _new_autocompleter(config)
+        self._query_cache = _new_query_cache(config)
+        self._melodies = {}
+        self._ids = {}
+        self._next_id = 0
+        self._fragments = {}
+        self.autocompleter.bulk_load(
+            self._index_entries(_melody_entries(_read_rows(config['file']))))
+
+    def _index_entries(self, entries: Iterable[tuple[CompactMelody, float, list[int]]]
+                       ) -> Iterator[tuple[CompactMelody, float, list[int]]]:
+        """Yield each of <entries>, adding its melody to the fragment index
+        as it is yielded.
+        """
+        for melody, weight, prefix in entries:
+            melody_id = self._next_id
+            self._next_id += 1
+            self._melodies[melody_id] = melody
+            self._ids[melody] = melody_id
+            for fragment in _interval_fragments(prefix):
+                self._fragments.setdefault(fragment, []).append(melody_id)
+            yield melody, weight, prefix
 
     def autocomplete(
         self, prefix: list[int], limit: int | None = None
@@ -232,9 +403,603 @@ class MelodyAutocompleteEngine:
         Preconditions:
         - limit is None or limit > 0
         """
+        return self._query_cache.get(self.autocompleter, (tuple(prefix), limit),
+                                     lambda: self.autocompleter.autocomplete(prefix, limit))
+
+    def search(self, fragment: list[int], limit: int | None = None
+               ) -> list[tuple[Melody, float]]:
+        """Return up to <limit> melodies whose interval sequence contains
+        <fragment> anywhere, not just at the start.
+
+        The return value is a list of tuples (melody, weight), sorted by
+        non-increasing weight. Each weight is the melody's current weight in
+        this engine's Autocompleter (see Autocompleter.weight_of), so it
+        reflects any changes made to the Autocompleter since the melody was
+        loaded. Ties are broken by the order of the melodies in the file.
+
+        If limit is None, return *every* melody containing <fragment>.
+
+        Only the melodies that contain the rarest run of _FRAGMENT_LENGTH
+        intervals in <fragment> (or the whole of a shorter <fragment>) are
+        checked, rather than every melody.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        length = min(len(fragment), _FRAGMENT_LENGTH)
+        if length == 0:
+            candidates: Collection[int] = self._melodies.keys()
+        else:
+            candidates = min((self._fragments.get(tuple(fragment[i:i + length]), [])
+                              for i in range(len(fragment) - length + 1)), key=len)
+        if len(candidates) == 0:
+            # This includes every fragment with an interval too large to be stored
+            return []
+
+        target = array('b', fragment).tobytes()
+        matches: list[tuple[Melody, float]] = []
+        for melody_id in candidates:
+            melody = self._melodies[melody_id]
+            if len(fragment) <= length or target in melody.intervals.tobytes():
+                weight = self.autocompleter.weight_of(melody, melody.intervals.tolist())
+                if weight > 0.0:
+                    # Otherwise the melody was removed from the Autocompleter directly
+                    matches.append((melody, weight))
+        matches.sort(key=lambda match: -match[1])
+        return matches if limit is None else matches[:limit]
+
+    def begin(self) -> AutocompleteCursor:
+        """Return a new session for autocompleting an interval sequence as it
+        is entered.
+
+        session.push(interval) enters one more interval, session.pop() deletes
+        the last one, and session.autocomplete(limit) returns the matches for
+        the intervals entered so far, as autocomplete does. Each push or pop
+        only moves the session one step through the Autocompleter, instead of
+        walking down from its root again for the whole prefix.
+        """
+        return self.autocompleter.cursor()
 
     def remove(self, prefix: list[int]) -> None:
-        """Remove all melodies that match the given interval sequence."""
+        """Remove all melodies that match the given interval sequence, along
+        with their runs of intervals in the fragment index.
+        """
+        for melody, _ in self.autocompleter.autocomplete(prefix):
+            melody_id = self._ids.pop(melody, None)
+            if melody_id is None:
+                # The melody was inserted into the Autocompleter directly, so
+                # it is not in the fragment index
+                continue
+            del self._melodies[melody_id]
+            for fragment in _interval_fragments(melody.intervals.tolist()):
+                ids = self._fragments[fragment]
+                del ids[bisect.bisect_left(ids, melody_id)]
+                if not ids:
+                    del self._fragments[fragment]
+        self.autocompleter.remove(prefix)
+
+    def cache_info(self) -> QueryCacheInfo:
+        """Return the hits, misses, maximum size and current size of this
+        engine's cache of autocomplete results.
+        """
+        return self._query_cache.info()
+
+    def cache_clear(self) -> None:
+        """Empty this engine's cache of autocomplete results and reset its
+        hit and miss counts.
+        """
+        self._query_cache.clear()
+
+
+@check_contracts_if_enabled
+class MelodyCodec(ValueCodec):
+    """A codec for saving prefix trees whose values are Melody objects, such as
+    those built by MelodyAutocompleteEngine, without pickling each melody.
+
+    The names of the melodies are stored in a string table, and the pitches and
+    durations of all their notes in two columns, as unsigned bytes and unsigned
+    16-bit integers respectively. Each melody is rebuilt from the columns when
+    it is accessed. Since the labels of a saved tree are not pickled either,
+    loading a file saved with this codec never unpickles anything.
+
+    >>> codec = MelodyCodec()
+    >>> data = codec.encode([Melody('Scale', [(60, 250), (62, 250), (64, 500)])])
+    >>> melody = codec.decode(memoryview(data), 1)[0]
+    >>> melody.name, melody.notes
+    ('Scale', [(60, 250), (62, 250), (64, 500)])
+    """
+    name = 'melody'
+
+    def encode(self, values: Sequence) -> bytes:
+        """Return the melodies in <values> encoded as bytes.
+
+        Raise ValueError if some note has a duration of 65536 or more.
+
+        Preconditions:
+        - all(isinstance(value, Melody) for value in values)
+        """
+        names = [melody.name.encode('utf8') for melody in values]
+        name_offsets = array('I', [0])
+        note_offsets = array('I', [0])
+        for name, melody in zip(names, values):
+            name_offsets.append(name_offsets[-1] + len(name))
+            note_offsets.append(note_offsets[-1] + len(melody.notes))
+        pitches = array('B', [pitch for melody in values for pitch, _ in melody.notes])
+        try:
+            durations = array('H', [duration for melody in values
+                                    for _, duration in melody.notes])
+        except OverflowError:
+            raise ValueError('MelodyCodec cannot encode durations of 65536 or more') from None
+        return pack_sections([name_offsets, note_offsets, pitches, durations, b''.join(names)])
+
+    def decode(self, data: memoryview, count: int) -> Sequence:
+        """Return the <count> melodies encoded in <data> by encode."""
+        (name_offsets, note_offsets), start = unpack_sections(
+            data, 0, [('I', count + 1), ('I', count + 1)])
+        (pitches, durations, names), _ = unpack_sections(
+            data, start, [('B', note_offsets[-1]), ('H', note_offsets[-1]),
+                          ('B', name_offsets[-1])])
+        return _StoredMelodies(name_offsets, note_offsets, pitches, durations, names)
+
+
+class _StoredMelodies(Sequence):
+    """The melodies decoded by a MelodyCodec, each rebuilt when it is accessed.
+    """
+    # Private Instance Attributes:
+    # - _name_offsets, _names:
+    #     The name of melody i is _names[_name_offsets[i]:_name_offsets[i + 1]],
+    #     encoded in UTF-8.
+    # - _note_offsets, _pitches, _durations:
+    #     The pitches and durations of the notes of melody i are at the indexes
+    #     from _note_offsets[i] to _note_offsets[i + 1] - 1 of _pitches and
+    #     _durations.
+    _name_offsets: memoryview
+    _note_offsets: memoryview
+    _pitches: memoryview
+    _durations: memoryview
+    _names: memoryview
+
+    def __init__(self, name_offsets: memoryview, note_offsets: memoryview,
+                 pitches: memoryview, durations: memoryview, names: memoryview) -> None:
+        """Initialize the melodies stored in the given columns."""
+        self._name_offsets = name_offsets
+        self._note_offsets = note_offsets
+        self._pitches = pitches
+        self._durations = durations
+        self._names = names
+
+    def __len__(self) -> int:
+        """Return the number of melodies."""
+        return len(self._note_offsets) - 1
+
+    def __getitem__(self, i: int) -> Melody:
+        """Return melody <i>."""
+        if not 0 <= i < len(self):
+            raise IndexError('melody index out of range')
+        name = str(self._names[self._name_offsets[i]:self._name_offsets[i + 1]], 'utf8')
+        start, end = self._note_offsets[i], self._note_offsets[i + 1]
+        return CompactMelody(name, list(zip(self._pitches[start:end].tolist(),
+                                            self._durations[start:end].tolist())))
+
+
+################################################################################
+# Caching autocomplete results
+################################################################################
+class QueryCacheInfo(NamedTuple):
+    """The statistics of an autocomplete engine's cache of results, as
+    returned by its cache_info method.
+
+    Instance Attributes:
+    - hits: The number of calls to autocomplete answered from the cache.
+    - misses: The number of calls to autocomplete that searched the Autocompleter.
+    - maxsize: The number of results the cache can hold.
+    - currsize: The number of results the cache holds.
+    """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class _QueryCache:
+    """A bounded cache of the results of an engine's autocomplete method,
+    which discards the least recently used result when it is full.
+
+    Results are keyed by the arguments to autocomplete, and are only reused
+    while the Autocompleter they came from has the same generation (see
+    Autocompleter.generation), so any insert, bulk_load or remove empties the
+    cache. If ttl is not None, each result is also only reused for ttl seconds.
+
+    Instance Attributes:
+    - maxsize: The number of results this cache can hold.
+    - ttl: The number of seconds a result can be reused for, or None.
+    - hits: The number of calls to get answered from this cache.
+    - misses: The number of calls to get that computed their result.
+
+    Representation Invariants:
+    - self.maxsize >= 0
+    - self.ttl is None or self.ttl > 0
+    """
+    # Private Instance Attributes:
+    # - _results:
+    #     Maps each key to the time its result expires (or 0.0 if ttl is None)
+    #     and the result, from the least to the most recently used.
+    # - _autocompleter, _generation:
+    #     The Autocompleter the results in _results came from, and its
+    #     generation when they were computed.
+    maxsize: int
+    ttl: float | None
+    hits: int
+    misses: int
+    _results: collections.OrderedDict[Any, tuple[float, list]]
+    _autocompleter: Autocompleter | None
+    _generation: int
+
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        """Initialize an empty cache holding up to <maxsize> results, each
+        reused for up to <ttl> seconds (or indefinitely, if <ttl> is None).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._results = collections.OrderedDict()
+        self._autocompleter = None
+        self._generation = 0
+
+    def get(self, autocompleter: Autocompleter, key: Any,
+            compute: Callable[[], list]) -> list:
+        """Return a copy of the result cached for <key>, or of the result of
+        calling <compute> if there is none that is still up to date.
+
+        <compute> must return the result computed from <autocompleter>, and
+        <key> must identify that result among those computed from it.
+        """
+        generation = autocompleter.generation()
+        if autocompleter is not self._autocompleter or generation != self._generation:
+            self._results.clear()
+            self._autocompleter = autocompleter
+            self._generation = generation
+
+        cached = self._results.get(key)
+        if cached is not None and (self.ttl is None or cached[0] > time.monotonic()):
+            self._results.move_to_end(key)
+            self.hits += 1
+            return list(cached[1])
+
+        self.misses += 1
+        result = compute()
+        if self.maxsize > 0:
+            # The result expires ttl seconds after it was computed, not after
+            # this call started, in case computing it took longer than ttl
+            expiry = 0.0 if self.ttl is None else time.monotonic() + self.ttl
+            self._results[key] = (expiry, result)
+            self._results.move_to_end(key)
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return list(result)
+
+    def info(self) -> QueryCacheInfo:
+        """Return the statistics of this cache."""
+        return QueryCacheInfo(self.hits, self.misses, self.maxsize, len(self._results))
+
+    def clear(self) -> None:
+        """Empty this cache and reset its hit and miss counts."""
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+###############################################################################
+# Helper functions
+###############################################################################
+# The length of the longest runs of intervals indexed by MelodyAutocompleteEngine
+_FRAGMENT_LENGTH = 3
+
+
+def _new_autocompleter(config: dict[str, Any]) -> Autocompleter:
+    """Return a new, empty Autocompleter of the kind named by config['autocompleter'],
+    caching config['cache_size'] top matches per prefix (if that key is present).
+
+    Preconditions:
+    - config['autocompleter'] in ['simple', 'compressed']
+    - config.get('cache_size', 0) >= 0
+    """
+    cache_size = config.get('cache_size', 0)
+    if config['autocompleter'] == 'compressed':
+        return CompressedPrefixTree(cache_size)
+    return SimplePrefixTree(cache_size)
+
+
+def _new_query_cache(config: dict[str, Any]) -> _QueryCache:
+    """Return a new, empty cache of autocomplete results, holding up to
+    config['query_cache_size'] results for up to config['query_cache_ttl']
+    seconds each (if those keys are present).
+
+    Preconditions:
+    - config.get('query_cache_size', 0) >= 0
+    - config.get('query_cache_ttl') is None or config['query_cache_ttl'] > 0
+    """
+    return _QueryCache(config.get('query_cache_size', 0), config.get('query_cache_ttl'))
+
+
+# The approximate number of characters read from a file at a time
+_BATCH_SIZE = 1 << 20
+# The number of lines taken at a time from an iterable that is not a file
+_BATCH_LINES = 4096
+# The first two bytes of every gzip-compressed file
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _read_batches(source: Any) -> Iterator[list[str]]:
+    """Yield the lines of <source> in batches, each a list of lines.
+
+    <source> is the path to a text file, which is read as gzip-compressed if it
+    starts with the gzip magic number, or a file opened in text or binary mode,
+    or any other iterable of lines. Files are read _BATCH_SIZE characters at a
+    time, and are decoded as UTF-8. The lines keep their line endings, if any.
+
+    >>> list(_read_batches(['a\\n', 'b\\n']))
+    [['a\\n', 'b\\n']]
+    >>> list(_read_batches(io.BytesIO(gzip.compress(b'a\\nb'))))
+    [['a\\n', 'b']]
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from _read_batches(f)
+    elif isinstance(source, (io.RawIOBase, io.BufferedIOBase)):
+        buffered = io.BufferedReader(source) if isinstance(source, io.RawIOBase) else source
+        binary = buffered
+        if not isinstance(buffered, gzip.GzipFile) and _starts_with_gzip_magic(buffered):
+            binary = gzip.GzipFile(fileobj=buffered)
+        # typeshed only accepts streams known to have a name attribute, which
+        # TextIOWrapper does not need
+        text = io.TextIOWrapper(cast(BinaryIO, binary), encoding='utf8', newline='')
+        try:
+            yield from _read_batches(text)
+        finally:
+            # Closing the wrappers would close <source> too, which belongs to
+            # the caller, so they are detached from it instead. (A GzipFile
+            # given a fileobj never closes it.)
+            text.detach()
+            if binary is not buffered:
+                binary.close()
+            if buffered is not source:
+                buffered.detach()
+    elif isinstance(source, io.TextIOBase):
+        batch = source.readlines(_BATCH_SIZE)
+        while batch:
+            yield batch
+            batch = source.readlines(_BATCH_SIZE)
+    else:
+        lines = iter(source)
+        batch = list(itertools.islice(lines, _BATCH_LINES))
+        while batch:
+            yield batch
+            batch = list(itertools.islice(lines, _BATCH_LINES))
+
+
+def _starts_with_gzip_magic(f: io.BufferedIOBase) -> bool:
+    """Return whether the rest of the binary file <f> starts with the gzip magic
+    number, without consuming any of it.
+
+    Preconditions:
+    - f has a peek method or is seekable
+    """
+    if hasattr(f, 'peek'):
+        return f.peek(len(_GZIP_MAGIC))[:len(_GZIP_MAGIC)] == _GZIP_MAGIC
+    position = f.tell()
+    magic = f.read(len(_GZIP_MAGIC))
+    f.seek(position)
+    return magic == _GZIP_MAGIC
+
+
+def _read_rows(source: Any) -> Iterator[list[str]]:
+    """Yield the rows of the CSV file <source>, which is anything accepted by
+    _read_batches.
+
+    >>> list(_read_rows(['cat,2\\n', '"a, b",1\\n']))
+    [['cat', '2'], ['a, b', '1']]
+    """
+    return csv.reader(itertools.chain.from_iterable(_read_batches(source)))
+
+
+def _load_entries(config: dict[str, Any],
+                  entries_function: Callable[[Iterable[list[str]]], Iterable[tuple]]
+                  ) -> Iterable[tuple]:
+    """Return the (value, weight, prefix) tuples to insert into the Autocompleter
+    of an engine with the given configuration, given the function that returns
+    them from the batches of lines of config['file'].
+
+    If config['file'] is the path to an uncompressed file and config['workers']
+    is more than 1, the file is split into that many ranges of lines, which are
+    read by separate processes, each adding up the weights of repeated values in
+    its range. Otherwise, the returned tuples are generated as the file is read.
+
+    Preconditions:
+    - entries_function is a top-level function of this module
+    """
+    source = config['file']
+    workers = config.get('workers', 1)
+    if workers == 1 or not isinstance(source, (str, os.PathLike)):
+        return entries_function(_read_batches(source))
+    with open(source, 'rb') as f:
+        if _starts_with_gzip_magic(f):
+            return entries_function(_read_batches(source))
+
+    offsets = _split_lines(source, workers)
+    totals: dict[Any, list[Any]] = {}
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        for range_totals in pool.map(_load_range, itertools.repeat(source), offsets,
+                                     offsets[1:], itertools.repeat(entries_function)):
+            for value, (weight, prefix) in range_totals.items():
+                if value in totals:
+                    totals[value][0] += weight
+                else:
+                    totals[value] = [weight, prefix]
+    return ((value, weight, prefix) for value, (weight, prefix) in totals.items())
+
+
+def _split_lines(file: str | os.PathLike, parts: int) -> list[int]:
+    """Return the offsets of the starts of <parts> ranges of about the same number
+    of bytes into which the lines of <file> are split, followed by the size of
+    <file>. Some ranges may be empty.
+    """
+    size = os.path.getsize(file)
+    offsets = [0]
+    with open(file, 'rb') as f:
+        for i in range(1, parts):
+            # Each range starts at the first line starting at or after its share
+            f.seek(max(size * i // parts - 1, offsets[-1]))
+            if f.tell() > 0:
+                f.readline()
+            offsets.append(max(f.tell(), offsets[-1]))
+    offsets.append(size)
+    return offsets
+
+
+def _load_range(file: str | os.PathLike, start: int, end: int,
+                entries_function: Callable[[Iterable[list[str]]], Iterable[tuple]]
+                ) -> dict[Any, list]:
+    """Return a dict mapping each value returned by <entries_function> for the
+    lines of <file> between byte offsets <start> and <end> to a list of its total
+    weight and its prefix.
+
+    This is run in a worker process by _load_entries.
+
+    Preconditions:
+    - <start> and <end> are the offsets of the starts of lines of <file>, or its size
+    """
+    totals: dict[Any, list[Any]] = {}
+    for value, weight, prefix in entries_function(_read_range(file, start, end)):
+        if value in totals:
+            totals[value][0] += weight
+        else:
+            totals[value] = [weight, prefix]
+    return totals
+
+
+def _read_range(file: str | os.PathLike, start: int, end: int) -> Iterator[list[str]]:
+    """Yield the lines of <file> between byte offsets <start> and <end> in
+    batches, like _read_batches.
+
+    Preconditions:
+    - <start> and <end> are the offsets of the starts of lines of <file>, or its size
+    """
+    with open(file, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            batch = f.readlines(min(_BATCH_SIZE, remaining))
+            size = sum(len(line) for line in batch)
+            while size > remaining:
+                # readlines may read one line past the hint, which starts at <end>
+                size -= len(batch.pop())
+            remaining -= size
+            yield [line.decode('utf8') for line in batch]
+
+
+def _letter_entries(batches: Iterable[list[str]]) -> Iterator[tuple[str, float, list[str]]]:
+    """Yield the (value, weight, prefix) tuple for each line in <batches> of a
+    LetterAutocompleteEngine's file whose sanitized string has at least one
+    non-space character.
+    """
+    for batch in batches:
+        for string in _sanitize_lines(batch):
+            if not string.isspace() and string != '':
+                yield string, 1.0, list(string)
+
+
+def _sentence_entries(batches: Iterable[list[str]]
+                      ) -> Iterator[tuple[str, float, list[str]]]:
+    """Yield the (value, weight, prefix) tuple for each row in <batches> of
+    lines of a SentenceAutocompleteEngine's CSV file whose sanitized string has
+    at least one word.
+    """
+    rows = csv.reader(itertools.chain.from_iterable(batches))
+    batch = list(itertools.islice(rows, _BATCH_LINES))
+    while batch:
+        for row, string in zip(batch, _sanitize_lines([row[0] for row in batch])):
+            words = string.split()
+            if words:
+                yield string, float(row[1]), words
+        batch = list(itertools.islice(rows, _BATCH_LINES))
+
+
+def _melody_entries(rows: Iterable[list[str]]
+                    ) -> Iterator[tuple[CompactMelody, float, list[int]]]:
+    """Yield the (value, weight, prefix) tuple for each row of a
+    MelodyAutocompleteEngine's CSV file.
+    """
+    for row in rows:
+        notes = []
+        for i in range(1, len(row) - 1, 2):
+            if row[i] == '' or row[i + 1] == '':
+                break
+            notes.append((int(row[i]), int(row[i + 1])))
+        melody = CompactMelody(row[0], notes)
+        yield melody, 1.0, melody.intervals.tolist()
+
+
+def _interval_fragments(intervals: list[int]) -> set[tuple[int, ...]]:
+    """Return the set of runs of 1 to _FRAGMENT_LENGTH consecutive intervals
+    in <intervals>.
+
+    >>> sorted(_interval_fragments([2, 2, 1]))
+    [(1,), (2,), (2, 1), (2, 2), (2, 2, 1)]
+    """
+    return {tuple(intervals[i:i + length])
+            for length in range(1, _FRAGMENT_LENGTH + 1)
+            for i in range(len(intervals) - length + 1)}
+
+
+# Translation tables that lowercase ASCII letters and delete every ASCII
+# character that is not alphanumeric or a space (apart from _SEPARATOR, in the
+# table used by _sanitize_lines)
+_ASCII_TABLE = str.maketrans(
+    ascii_uppercase, ascii_lowercase,
+    ''.join(chr(i) for i in range(128) if not chr(i).isalnum() and chr(i) != ' ')
+)
+_SEPARATOR = '\0'
+_ASCII_BATCH_TABLE = {**_ASCII_TABLE, ord(_SEPARATOR): ord(_SEPARATOR)}
+# A pattern matching the characters that _sanitize deletes from lowercased
+# strings that are not entirely ASCII. (\w matches the alphanumeric characters
+# and the underscore.)
+_DELETED = re.compile(r'[^\w ]|_')
+
+
+def _sanitize(line: str) -> str:
+    """Return <line> sanitized as described in the assignment handout:
+    converted to lowercase, with every character that is not alphanumeric
+    or a space removed.
+
+    >>> _sanitize('a!!! StAr? IS B&*o()rN')
+    'a star is born'
+    >>> _sanitize('Ça_va, Émile? 42!')
+    'çava émile 42'
+    """
+    if line.isascii():
+        return line.translate(_ASCII_TABLE)
+    return _DELETED.sub('', line.lower())
+
+
+def _sanitize_lines(lines: list[str]) -> list[str]:
+    """Return a list of each line in <lines> sanitized as by _sanitize.
+
+    The lines are sanitized together, as one string, which is much faster than
+    sanitizing them one at a time when there are many short lines.
+
+    >>> _sanitize_lines(['Cat!\\n', '', 'Ça va?'])
+    ['cat', '', 'ça va']
+    """
+    if not lines:
+        return []
+    text = _SEPARATOR.join(lines)
+    if text.isascii() and text.count(_SEPARATOR) == len(lines) - 1:
+        return text.translate(_ASCII_BATCH_TABLE).split(_SEPARATOR)
+    # Sanitizing each line separately lets most lines still use the
+    # translation table, and copes with lines containing the separator.
+    return [_sanitize(line) for line in lines]
 
 
 ###############################################################################
@@ -246,10 +1011,9 @@ def example_letter_autocomplete() -> list[tuple[str, float]]:
     Notes:
     - You can open .txt files directly in PyCharm to see their contents.
     - You can try out the larger ".txt" datasets under data/texts. If you do so,
-      we recommend TEMPORARILY commenting out the @check_contracts decorator for
-      the SimpleTreePrefix/CompressedTreePrefix classes to help speed up the
-      computation. Just make sure to uncomment the decorator before your final
-      submission.
+      we recommend setting the environment variable A2_CHECK_CONTRACTS=0 before
+      running, which turns off contract checking to help speed up the
+      computation (e.g., A2_CHECK_CONTRACTS=0 python a2_autocomplete_engines.py).
     - For lotr.txt, try the prefix 'frodo' or 'gandalf' 🧙
       Make sure to put in a limit!
     """
@@ -281,11 +1045,13 @@ def example_sentence_autocomplete() -> list[tuple[str, float]]:
 def example_melody_autocomplete(play: bool = False) -> list[tuple[Melody, float]]:
     """A sample run of the melody autocomplete engine.
 
-    If <play> is True, also play each melody using Pygame.
+    If <play> is True, also play each melody using Pygame, with 2 seconds of
+    silence after each one. The melodies are played in the background, and this
+    function returns once they have all been played.
 
     Notes:
-    - You may wish to comment out the @check_contracts decorator for the prefix tree classes
-      and Melody for this example.
+    - You may wish to set A2_CHECK_CONTRACTS=0 (see example_letter_autocomplete)
+      for this example.
     - You can try the other datasets under data/melodies.
     - Remember, you can open csv files in PyCharm, too!
     """
@@ -298,18 +1064,18 @@ def example_melody_autocomplete(play: bool = False) -> list[tuple[Melody, float]
     melodies = engine.autocomplete([0, 0], 3)
 
     if play:
+        player = MelodyPlayer(gap=2.0)
         for melody, _ in melodies:
-            melody.play()
-            time.sleep(2)  # Wait 2 seconds after playing each melody
+            melody.play(player)
+        player.wait()
+        player.close()
 
     return melodies
 
 
 if __name__ == '__main__':
-    # This is used to increase the recursion limit so that your autocomplete engines work
-    # even for tall SimplePrefixTrees.
-    import sys
-    sys.setrecursionlimit(5000)
+    import doctest
+    doctest.testmod()
 
     # print(example_letter_autocomplete())
     # print(example_sentence_autocomplete())
@@ -331,9 +1097,15 @@ if __name__ == '__main__':
     #         'allowed-io': [
     #             'LetterAutocompleteEngine.__init__',
     #             'SentenceAutocompleteEngine.__init__',
-    #             'MelodyAutocompleteEngine.__init__'
+    #             'MelodyAutocompleteEngine.__init__',
+    #             '_read_batches',
+    #             '_load_entries',
+    #             '_split_lines',
+    #             '_read_range'
     #         ],
-    #         'extra-imports': ['csv', 'time', 'sys', 'a2_prefix_tree', 'a2_melody'],
+    #         'extra-imports': ['array', 'bisect', 'collections', 'collections.abc',
+    #                           'concurrent.futures', 'csv', 'gzip', 'io', 'itertools', 'os', 're',
+    #                           'string', 'time', 'a2_prefix_tree', 'a2_melody'],
     #         'max-line-length': 100,
     #     }
     # )
@@ -0,0 +1,169 @@
+"""CSC148 Assignment 2: Benchmarks
+
+=== Module description ===
+This file contains benchmarks for the autocomplete engines on the bundled
+datasets. Run it from the root of the assignment (so that the data/ paths
+resolve), optionally naming the benchmarks to run:
+
+    python a2_benchmarks.py memory contracts
+
+Contract checking is turned off (A2_CHECK_CONTRACTS=0) unless the environment
+says otherwise, since the benchmarks measure the engines as they would run in
+production.
+"""
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable
+
+# This must be set before the assignment modules are imported.
+os.environ.setdefault('A2_CHECK_CONTRACTS', '0')
+
+# pylint: disable=wrong-import-position
+from a2_autocomplete_engines import (
+    LetterAutocompleteEngine, SentenceAutocompleteEngine, MelodyAutocompleteEngine,
+    _sanitize, _sanitize_lines
+)
+
+# (engine class, data file) pairs for every engine and bundled dataset benchmarked
+DATASETS = [
+    (LetterAutocompleteEngine, 'data/texts/lotr.txt'),
+    (LetterAutocompleteEngine, 'data/texts/google_no_swears.txt'),
+    (SentenceAutocompleteEngine, 'data/texts/google_searches.csv'),
+    (MelodyAutocompleteEngine, 'data/melodies/random_melodies_c_scale.csv'),
+    (MelodyAutocompleteEngine, 'data/melodies/songbook.csv'),
+]
+
+
+def benchmark_memory() -> None:
+    """Print the memory used per stored value by each engine and autocompleter
+    on each dataset in DATASETS, and by a frozen copy of each autocompleter.
+
+    Memory is measured with tracemalloc as the size of the blocks still
+    allocated once the engine has been built, so it includes the stored values
+    themselves as well as the prefix tree.
+    """
+    print(f'{"engine":<28}{"file":<30}{"tree":<20}{"values":>8}'
+          f'{"total KiB":>12}{"bytes/value":>13}')
+    for engine_class, file in DATASETS:
+        for autocompleter in ['simple', 'compressed']:
+            tracemalloc.start()
+            engine = engine_class({'file': file, 'autocompleter': autocompleter})
+            size, _ = tracemalloc.get_traced_memory()
+            _print_memory(engine_class, file, autocompleter, len(engine.autocompleter), size)
+
+            engine.autocompleter = engine.autocompleter.freeze()
+            size, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _print_memory(engine_class, file, autocompleter + '/frozen',
+                          len(engine.autocompleter), size)
+
+
+def _print_memory(engine_class: type, file: str, autocompleter: str,
+                  values: int, size: int) -> None:
+    """Print one row of the table printed by benchmark_memory."""
+    print(f'{engine_class.__name__:<28}{file.split("/")[-1]:<30}{autocompleter:<20}'
+          f'{values:>8}{size / 1024:>12.0f}{size / values:>13.0f}')
+
+
+# (engine class name, data file, query) triples timed by benchmark_contracts.
+# These are small datasets, since loading large ones with contract checking
+# on takes minutes.
+CONTRACT_DATASETS = [
+    ('LetterAutocompleteEngine', 'data/texts/sample_words.txt', 'ca'),
+    ('SentenceAutocompleteEngine', 'data/texts/google_searches.csv', 'how to'),
+    ('MelodyAutocompleteEngine', 'data/melodies/songbook.csv', [0, 0]),
+]
+
+
+def benchmark_contracts() -> None:
+    """Print the time to load each dataset in CONTRACT_DATASETS and to answer
+    100 queries on it, with contract checking on and off.
+
+    Since contract checking is chosen when the assignment modules are imported,
+    each measurement is made in a new Python process.
+    """
+    print(f'{"engine":<28}{"file":<22}{"contracts":<11}{"load ms":>10}{"query us":>10}')
+    for engine_name, file, query in CONTRACT_DATASETS:
+        for setting in ['1', '0']:
+            output = subprocess.run(
+                [sys.executable, '-c',
+                 f'import a2_benchmarks; a2_benchmarks.time_engine({engine_name!r}, '
+                 f'{file!r}, {query!r})'],
+                env={**os.environ, 'A2_CHECK_CONTRACTS': setting},
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            load, query_time = float(output[-2]), float(output[-1])
+            print(f'{engine_name:<28}{file.split("/")[-1]:<22}'
+                  f'{"on" if setting == "1" else "off":<11}{load * 1e3:>10.1f}'
+                  f'{query_time * 1e6:>10.1f}')
+
+
+def time_engine(engine_name: str, file: str, query: Any, repeat: int = 100) -> None:
+    """Print the time in seconds to build the named engine on <file>, and the
+    mean time in seconds to autocomplete <query> with a limit of 10.
+    """
+    engine_class = globals()[engine_name]
+    start = time.perf_counter()
+    engine = engine_class({'file': file, 'autocompleter': 'compressed'})
+    load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        engine.autocomplete(query, 10)
+    print(load, (time.perf_counter() - start) / repeat)
+
+
+# Text files whose lines are sanitized by benchmark_sanitize
+SANITIZE_FILES = ['data/texts/lotr.txt', 'data/texts/google_no_swears.txt']
+
+
+def benchmark_sanitize(repeat: int = 5) -> None:
+    """Print the time to sanitize every line of each file in SANITIZE_FILES
+    with a naive loop over the characters, with _sanitize, and with
+    _sanitize_lines, taking the best of <repeat> runs of each.
+    """
+    print(f'{"file":<30}{"lines":>8}{"naive ms":>10}{"_sanitize ms":>14}'
+          f'{"_sanitize_lines ms":>20}')
+    for file in SANITIZE_FILES:
+        with open(file, encoding='utf8') as f:
+            lines = f.readlines()
+        times = []
+        for sanitize_all in [lambda: [_naive_sanitize(line) for line in lines],
+                             lambda: [_sanitize(line) for line in lines],
+                             lambda: _sanitize_lines(lines)]:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                sanitize_all()
+                best = min(best, time.perf_counter() - start)
+            times.append(best)
+        print(f'{file.split("/")[-1]:<30}{len(lines):>8}{times[0] * 1e3:>10.1f}'
+              f'{times[1] * 1e3:>14.1f}{times[2] * 1e3:>20.1f}')
+
+
+def _naive_sanitize(string: str) -> str:
+    """Return <string> sanitized as the handout describes, by testing each
+    character of the lowercased string in a Python-level loop.
+
+    This is the straightforward implementation that benchmark_sanitize
+    compares _sanitize and _sanitize_lines against; it gives the same results.
+    """
+    return ''.join(char for char in string.lower() if char.isalnum() or char == ' ')
+
+
+BENCHMARKS: dict[str, Callable[[], Any]] = {
+    'memory': benchmark_memory,
+    'contracts': benchmark_contracts,
+    'sanitize': benchmark_sanitize,
+}
+
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        print(f'=== {name} ===')
+        start = time.perf_counter()
+        BENCHMARKS[name]()
+        print(f'({time.perf_counter() - start:.1f}s)\n')
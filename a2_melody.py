@@ -10,14 +10,23 @@ representation of melodies and different music file formats.
 
 You should not change anything in this file.
 """
+from __future__ import annotations
+import collections
+import functools
 import io
+import threading
+import time
+from array import array
+
+from typing import Any
 
 import mido
-from python_ta.contracts import check_contracts
 import pygame
 
+from a2_prefix_tree import check_contracts_if_enabled
+
 
-@check_contracts
+@check_contracts_if_enabled
 class Melody:
     """A class representing a melody.
 
@@ -46,15 +55,291 @@ class Melody:
         self.name = name
         self.notes = notes
 
-    def play(self) -> None:
-        """Play this melody (make sure your computer's speakers are on!)."""
-        play_midi_sequence(self.notes)
+    def play(self, player: MelodyPlayer | None = None) -> None:
+        """Play this melody (make sure your computer's speakers are on!).
+
+        If <player> is None, return once the melody has finished playing.
+        Otherwise, add the melody to the queue of <player> and return right
+        away, while it is played in the background.
+        """
+        if player is None:
+            play_midi_sequence(self.notes)
+        else:
+            player.play(self)
 
     def __repr__(self) -> str:
         """Return a string representation of this melody."""
         return f'Melody(name={repr(self.name)}, notes={self.notes})'
 
 
+@check_contracts_if_enabled
+class CompactMelody(Melody):
+    """A melody that stores its notes compactly, in typed arrays.
+
+    A CompactMelody can be used wherever a Melody can. Its notes attribute is
+    rebuilt from the arrays each time it is accessed, so it should be read
+    once rather than indexed repeatedly; the pitches, durations and intervals
+    attributes can be used directly instead. Assigning to notes rebuilds the
+    arrays.
+
+    Instance Attributes:
+    - pitches: the pitch of each note
+    - durations: the duration of each note, in milliseconds
+    - intervals: the interval sequence of this melody: the differences between
+      the pitches of each pair of consecutive notes
+
+    Representation Invariants:
+    - len(self.pitches) == len(self.durations) == len(self.intervals) + 1
+    """
+    pitches: array
+    durations: array
+    intervals: array
+
+    @property
+    def notes(self) -> list[tuple[int, int]]:
+        """The notes of this melody, as (pitch, duration) tuples."""
+        return list(zip(self.pitches, self.durations))
+
+    @notes.setter
+    def notes(self, notes: list[tuple[int, int]]) -> None:
+        """Set the notes of this melody to <notes>, rebuilding its arrays."""
+        pitches = array('B', [pitch for pitch, _ in notes])
+        durations = array('I', [duration for _, duration in notes])
+        intervals = array('b', [pitches[i + 1] - pitches[i] for i in range(len(pitches) - 1)])
+        self.pitches, self.durations, self.intervals = pitches, durations, intervals
+
+
+# The number of rendered MIDI files kept by _render_midi
+MIDI_CACHE_SIZE = 256
+
+
+@check_contracts_if_enabled
+class MelodyPlayer:
+    """A queue of melodies that are played one after another on a background
+    thread, so that queueing a melody returns right away.
+
+    Melodies are played by a playback backend: by default a PygameBackend,
+    which plays them on the speakers, or else an object with the same methods,
+    such as a DummyBackend.
+
+    >>> player = MelodyPlayer(DummyBackend())
+    >>> player.play(Melody('a', [(60, 100)]))
+    >>> player.wait(1.0)
+    True
+    >>> player.close()
+    """
+    # Private Instance Attributes:
+    # - _backend: plays each melody
+    # - _gap: the seconds of silence after each melody
+    # - _queue: the melodies waiting to be played, in order
+    # - _now_playing: the melody being played (or followed by its gap), if any
+    # - _stop_current: whether _now_playing should be stopped
+    # - _closed: whether close has been called
+    # - _last_error: the last error raised by _backend when starting a melody
+    # - _lock: guards the attributes above, and is notified whenever they change
+    # - _thread: the thread playing the melodies, started by the first play
+    _backend: Any
+    _gap: float
+    _queue: collections.deque
+    _now_playing: Melody | None
+    _stop_current: bool
+    _closed: bool
+    _last_error: Exception | None
+    _lock: threading.Condition
+    _thread: threading.Thread | None
+
+    def __init__(self, backend: Any = None, gap: float = 0.0) -> None:
+        """Initialize an empty player that plays melodies with <backend> (a new
+        PygameBackend if <backend> is None), with <gap> seconds of silence
+        after each melody.
+
+        Preconditions:
+        - gap >= 0.0
+        """
+        self._backend = backend if backend is not None else PygameBackend()
+        self._gap = gap
+        self._queue = collections.deque()
+        self._now_playing = None
+        self._stop_current = False
+        self._closed = False
+        self._last_error = None
+        self._lock = threading.Condition()
+        self._thread = None
+
+    @property
+    def now_playing(self) -> Melody | None:
+        """The melody being played, or None if there is none."""
+        return self._now_playing
+
+    @property
+    def last_error(self) -> Exception | None:
+        """The last error raised when starting to play a melody (for example,
+        if pygame cannot play MIDI files on this computer), or None if there
+        has been none. A melody that cannot be played is skipped.
+        """
+        return self._last_error
+
+    def pending(self) -> list[Melody]:
+        """Return the melodies waiting to be played, in order."""
+        with self._lock:
+            return list(self._queue)
+
+    def play(self, melody: Melody) -> None:
+        """Add <melody> to the end of the queue, and return right away.
+
+        Preconditions:
+        - this player has not been closed
+        """
+        with self._lock:
+            self._queue.append(melody)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._lock.notify_all()
+
+    def skip(self) -> None:
+        """Stop the melody being played, if any, and go on to the next one."""
+        with self._lock:
+            if self._now_playing is not None:
+                self._stop_current = True
+                self._lock.notify_all()
+
+    def cancel(self) -> None:
+        """Stop the melody being played, if any, and empty the queue."""
+        with self._lock:
+            self._queue.clear()
+            self.skip()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Wait until every queued melody has been played (or skipped), for at
+        most <timeout> seconds if <timeout> is not None.
+
+        Return whether every queued melody has been played.
+        """
+        with self._lock:
+            return self._lock.wait_for(
+                lambda: not self._queue and self._now_playing is None, timeout)
+
+    def close(self) -> None:
+        """Cancel all playback, and wait for the background thread to finish."""
+        with self._lock:
+            self._closed = True
+            self.cancel()
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        """Play the queued melodies until this player is closed.
+
+        This runs on the background thread.
+        """
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._queue or self._closed)
+                if self._closed:
+                    return
+                melody = self._queue.popleft()
+                self._now_playing = melody
+                self._stop_current = False
+
+            notes = melody.notes
+            try:
+                self._backend.start(create_midi_file(notes),
+                                    sum(duration for _, duration in notes) / 1000)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # Go on to the next melody, rather than leave wait blocked forever
+                with self._lock:
+                    self._last_error = error
+                    self._now_playing = None
+                    self._lock.notify_all()
+                continue
+
+            with self._lock:
+                gap_end = None
+                while not self._stop_current:
+                    if self._backend.is_busy():
+                        self._lock.wait(_POLL_INTERVAL)
+                        continue
+                    if gap_end is None:
+                        gap_end = time.monotonic() + self._gap
+                    if time.monotonic() >= gap_end:
+                        break
+                    self._lock.wait(gap_end - time.monotonic())
+                if self._stop_current:
+                    self._backend.stop()
+                self._now_playing = None
+                self._lock.notify_all()
+
+
+# The seconds between checks of whether a backend has finished playing
+_POLL_INTERVAL = 0.05
+
+
+class PygameBackend:
+    """A playback backend for MelodyPlayer that plays MIDI files with pygame.
+
+    The pygame mixer is initialized when the first file is played, and reused
+    after that.
+    """
+
+    def start(self, midi_file: io.BytesIO, duration: float) -> None:
+        """Start playing <midi_file>, which lasts <duration> seconds."""
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        pygame.mixer.music.load(midi_file)
+        pygame.mixer.music.play()
+
+    def is_busy(self) -> bool:
+        """Return whether a file is still playing."""
+        return pygame.mixer.music.get_busy()
+
+    def stop(self) -> None:
+        """Stop the file being played."""
+        pygame.mixer.music.stop()
+
+
+class DummyBackend:
+    """A playback backend for MelodyPlayer that plays nothing, but records the
+    files it is given, and stays busy for as long as each would play (scaled
+    by a time scale).
+
+    Instance Attributes:
+    - time_scale: the ratio of the time each file is "played" for to its duration
+    - played: the contents of each file started, in order
+    - stopped: the number of files stopped before they finished
+    """
+    time_scale: float
+    played: list[bytes]
+    stopped: int
+    # Private Instance Attributes:
+    # - _end: the time.monotonic() time when the file being played finishes
+    _end: float
+
+    def __init__(self, time_scale: float = 0.0) -> None:
+        """Initialize a backend that stays busy for <time_scale> times the
+        duration of each file.
+        """
+        self.time_scale = time_scale
+        self.played = []
+        self.stopped = 0
+        self._end = 0.0
+
+    def start(self, midi_file: io.BytesIO, duration: float) -> None:
+        """Start "playing" <midi_file>, which lasts <duration> seconds."""
+        self.played.append(midi_file.getvalue())
+        self._end = time.monotonic() + duration * self.time_scale
+
+    def is_busy(self) -> bool:
+        """Return whether a file is still "playing"."""
+        return time.monotonic() < self._end
+
+    def stop(self) -> None:
+        """Stop the file being "played"."""
+        self._end = 0.0
+        self.stopped += 1
+
+
 def play_midi_sequence(notes: list[tuple[int, int]]) -> None:
     """Given a list of notes, create a MIDI file and play it.
     """
@@ -64,19 +349,55 @@ def play_midi_sequence(notes: list[tuple[int, int]]) -> None:
 
 def play_midi_file(midi_file: io.BytesIO) -> None:
     """Given a file (or file-like) MIDI object, play it using pygame.
+
+    The pygame mixer is initialized the first time a file is played, and
+    reused after that.
     """
-    pygame.mixer.init()
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
     pygame.mixer.music.load(midi_file)
     pygame.mixer.music.play()
 
+    clock = pygame.time.Clock()
     while pygame.mixer.music.get_busy():
-        pygame.time.Clock().tick(10)
+        clock.tick(10)
 
 
 def create_midi_file(notes: list[tuple[int, int]]) -> io.BytesIO:
     """Create a MIDI file from the given list of notes.
 
-    Notes are played with piano instrument.
+    Notes are played with piano instrument. The last MIDI_CACHE_SIZE distinct
+    note sequences rendered are cached, so creating the file for the same
+    notes again does not render them again.
+    """
+    return io.BytesIO(_render_midi(tuple(notes)))
+
+
+def create_midi_files(melodies: list[Melody]) -> list[io.BytesIO]:
+    """Create a MIDI file for each melody in <melodies>, as create_midi_file
+    does for its notes.
+
+    Each distinct note sequence is rendered (or taken from the cache) only
+    once, however many of the melodies have it.
+
+    >>> files = create_midi_files([Melody('a', [(60, 100)]), Melody('b', [(60, 100)])])
+    >>> files[0].getvalue() == files[1].getvalue()
+    True
+    """
+    rendered = {}
+    files = []
+    for melody in melodies:
+        notes = tuple(melody.notes)
+        if notes not in rendered:
+            rendered[notes] = _render_midi(notes)
+        files.append(io.BytesIO(rendered[notes]))
+    return files
+
+
+@functools.lru_cache(maxsize=MIDI_CACHE_SIZE)
+def _render_midi(notes: tuple[tuple[int, int], ...]) -> bytes:
+    """Return the contents of a MIDI file playing the given notes with piano
+    instrument.
     """
     byte_stream = io.BytesIO()
 
@@ -90,4 +411,4 @@ def create_midi_file(notes: list[tuple[int, int]]) -> io.BytesIO:
 
     mid.save(file=byte_stream)
 
-    return io.BytesIO(byte_stream.getvalue())
+    return byte_stream.getvalue()
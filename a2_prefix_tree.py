@@ -15,10 +15,55 @@ testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
 """
 from __future__ import annotations
+import bisect
+import collections
+import heapq
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from collections.abc import Iterable, Sequence
 from typing import Any
 from python_ta.contracts import check_contracts
 
 
+# The subtrees list shared by every leaf, which must never be mutated
+_NO_SUBTREES = []
+# The empty index shared by every tree that has no index of a kind, which must
+# never be mutated (so it is only ever mutated after an identity check)
+_NO_INDEX: dict = {}
+# Trees with at most this many subtrees find non-leaf subtrees by scanning
+# their subtrees list, rather than by keeping a dict index of them
+_MAX_UNINDEXED = 4
+# Once decay has shrunk a tree's scale below this, its stored weights are
+# rescaled, so that the weights inserted afterwards do not overflow
+_MIN_SCALE = 1e-100
+# remove re-adds the weights of a tree's subtrees rather than subtracting the
+# removed weight from the tree's weight when less than this fraction of it is
+# left, since the difference could then be mostly rounding error
+_MIN_REMAINING = 1e-6
+# _index_of scans subtrees lists up to this long with list.index, which runs in
+# C and beats a binary search with a Python key function on short lists
+_MAX_SCANNED = 64
+
+
+def check_contracts_if_enabled(obj: Any) -> Any:
+    """Return <obj> decorated with python_ta's check_contracts, unless contract
+    checking has been turned off.
+
+    Contract checking is on by default. Setting the environment variable
+    A2_CHECK_CONTRACTS=0 turns it off for production use on large datasets:
+    the classes decorated with this function are then left undecorated, so
+    they run with no python_ta overhead at all. (Classes are decorated when
+    their module is imported, so the variable must be set before then.)
+    """
+    if os.environ.get('A2_CHECK_CONTRACTS') == '0':
+        return obj
+    return check_contracts(obj)
+
+
 ################################################################################
 # The Autocompleter ADT
 ################################################################################
@@ -47,6 +92,19 @@ class Autocompleter:
         """
         raise NotImplementedError
 
+    def bulk_load(self, entries: Iterable[tuple[Any, float, list]]) -> None:
+        """Insert each (value, weight, prefix) tuple in <entries> into this
+        Autocompleter, exactly as if insert were called for each of them in turn.
+
+        Subclasses may override this to insert many values faster than
+        separate calls to insert can.
+
+        Preconditions:
+        - every tuple in <entries> satisfies the preconditions of insert
+        """
+        for value, weight, prefix in entries:
+            self.insert(value, weight, prefix)
+
     def autocomplete(self, prefix: list,
                      limit: int | None = None) -> list[tuple[Any, float]]:
         """Return up to <limit> matches for the given prefix.
@@ -61,16 +119,131 @@ class Autocompleter:
         """
         raise NotImplementedError
 
+    def weight_of(self, value: Any, prefix: list) -> float:
+        """Return the weight of <value>, which was inserted with the prefix
+        sequence <prefix>, or 0.0 if <value> is not in this Autocompleter.
+
+        This default implementation searches every match for <prefix>.
+        Subclasses may override it to find the value directly.
+        """
+        for match, weight in self.autocomplete(prefix):
+            if match == value:
+                return weight
+        return 0.0
+
+    def fuzzy_autocomplete(self, prefix: list, max_distance: int,
+                           limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix, allowing up to
+        <max_distance> edits.
+
+        A value matches if some prefix of its prefix sequence is within
+        Levenshtein distance <max_distance> of <prefix>: that is, it can be
+        turned into <prefix> by at most <max_distance> insertions, deletions
+        and substitutions of single elements.
+
+        The return value is a list of tuples (value, weight), sorted by
+        non-increasing weight, as for autocomplete.
+
+        Preconditions:
+        - max_distance >= 0
+        - limit is None or limit > 0
+        """
+        raise NotImplementedError
+
     def remove(self, prefix: list) -> None:
         """Remove all values that match the given prefix.
         """
         raise NotImplementedError
 
+    def decay(self, factor: float) -> None:
+        """Multiply the weight of every value in this Autocompleter by <factor>.
+
+        Calling this regularly (for example, with a factor of
+        0.5 ** (elapsed time / half-life)) makes values inserted recently
+        outrank values that were only popular long ago.
+
+        Preconditions:
+        - 0 < factor <= 1
+        """
+        raise NotImplementedError
+
+    def compact(self, threshold: float) -> None:
+        """Remove every value whose weight is less than <threshold>.
+
+        Preconditions:
+        - threshold > 0
+        """
+        raise NotImplementedError
+
+    def generation(self) -> int:
+        """Return the number of times the values or weights stored in this
+        Autocompleter have been changed (by insert, bulk_load, remove, decay or
+        compact).
+
+        Callers that cache results computed from this Autocompleter can compare
+        generations to tell whether those results are still up to date.
+
+        This default implementation always returns 0, which is only correct for
+        an Autocompleter that is never changed; subclasses that can be changed
+        should override it.
+        """
+        return 0
+
+    def cursor(self) -> AutocompleteCursor:
+        """Return a new AutocompleteCursor for this Autocompleter, whose prefix
+        is empty.
+        """
+        return AutocompleteCursor(self)
+
+    def _cursor_start(self) -> Any:
+        """Return the state of an AutocompleteCursor whose prefix is empty.
+
+        A cursor's state stands for the values matching its prefix, and is
+        None if there are none. Here the state is just the prefix, as a tuple;
+        subclasses override _cursor_start, _cursor_step and _cursor_complete to
+        keep the subtree matching the prefix instead.
+        """
+        return ()
+
+    def _cursor_step(self, state: Any, depth: int, element: Any) -> Any:
+        """Return the state of a cursor whose prefix is the prefix of length
+        <depth> with state <state>, followed by <element>.
+
+        Preconditions:
+        - state is not None
+        """
+        # Here the state is the prefix itself, so its length is <depth>
+        assert len(state) == depth
+        return state + (element,)
+
+    def _cursor_complete(self, state: Any, limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix with state <state>, as
+        autocomplete does.
+
+        Preconditions:
+        - state is not None
+        - limit is None or limit > 0
+        """
+        return self.autocomplete(list(state), limit)
+
+    def save(self, path: str | os.PathLike, codec: ValueCodec | None = None) -> None:
+        """Write the values stored in this Autocompleter, with their weights and
+        prefixes, to the file at <path>, which FrozenPrefixTree.load can read.
+
+        The values are written by <codec> (a PickleCodec if <codec> is None).
+
+        Preconditions:
+        - every value stored in this Autocompleter can be encoded by <codec>
+        - every prefix element stored in this Autocompleter is a str, or an int
+          that fits in 64 bits
+        """
+        raise NotImplementedError
+
 
 ################################################################################
 # SimplePrefixTree (Tasks 1-3)
 ################################################################################
-@check_contracts
+@check_contracts_if_enabled
 class SimplePrefixTree(Autocompleter):
     """A simple prefix tree.
 
@@ -90,6 +263,9 @@ class SimplePrefixTree(Autocompleter):
         - If this tree is a leaf, this stores the weight of the value stored in the leaf.
         - If this tree is not a leaf and non-empty, this stores the *total weight* of
           the leaf weights in this tree.
+        Once decay has been called, the weights stored in a tree and its subtrees
+        are the actual weights of its values divided by a common factor (see
+        SimplePrefixTree.decay). autocomplete always returns actual weights.
 
     Representation invariants:
     - self.weight >= 0
@@ -114,16 +290,82 @@ class SimplePrefixTree(Autocompleter):
     root: Any
     weight: float
     subtrees: list[SimplePrefixTree]
+    # Private Instance Attributes:
+    # - _root, _depth:
+    #     The storage behind root. If _depth == -1, root is _root itself.
+    #     Otherwise root is the list _root[:_depth]; a new chain of subtrees
+    #     created by one insert shares a single _root list, so the prefixes
+    #     are not copied for every subtree. Only the root of a whole tree has
+    #     _depth == 0, and its _root list holds nothing but the tree's
+    #     _TreeState, once it has one (see _state).
+    # - _children:
+    #     Maps the next prefix element to the non-leaf subtree that extends
+    #     self.root with that element. Contains exactly the non-leaf subtrees,
+    #     once this tree has more than _MAX_UNINDEXED subtrees; until then it
+    #     is _NO_INDEX. Use the _find_child, _add_child, _replace_child and
+    #     _remove_child methods rather than accessing it directly.
+    # - _leaves:
+    #     Maps each (hashable) value stored directly below this tree to its leaf.
+    # - _num_leaves:
+    #     The number of leaves in this tree (1 if this tree is itself a leaf).
+    # - _top:
+    #     None, or the (value, weight) tuples of the K leaves in this non-leaf
+    #     tree with the largest weights, where K is the cache_size of the whole
+    #     tree's _TreeState (or all of its leaves, if it has fewer than K),
+    #     sorted by non-increasing weight. It is filled in by the first
+    #     autocomplete that needs it, kept up to date by insert, and reset to
+    #     None by every other change to the leaves of this tree.
+    #
+    # Trees are stored with __slots__. Leaves share _NO_SUBTREES as their
+    # subtrees list, and trees without an index share _NO_INDEX instead of
+    # allocating an empty dict of their own. (Autocompleter has no __slots__,
+    # so trees still get a __dict__ when python_ta's contract checking needs
+    # one, but it is never allocated otherwise.)
+    __slots__ = ('_root', '_depth', 'weight', 'subtrees', '_children', '_leaves',
+                 '_num_leaves', '_top')
+    _root: Any
+    _depth: int
+    _children: dict[Any, SimplePrefixTree]
+    _leaves: dict[Any, SimplePrefixTree]
+    _num_leaves: int
+    _top: list[tuple[Any, float]] | None
 
     ###########################################################################
     # Part 1(a)
     ###########################################################################
-    def __init__(self) -> None:
+    def __init__(self, cache_size: int = 0) -> None:
         """Initialize an empty simple prefix tree.
+
+        If <cache_size> is positive, each subtree that autocomplete is called
+        for caches its top <cache_size> matches, so that later calls with a
+        limit of at most <cache_size> only walk down to the subtree. This
+        trades memory for faster repeated queries.
+
+        Preconditions:
+        - cache_size >= 0
         """
         self.root = []
         self.weight = 0.0
         self.subtrees = []
+        self._children = _NO_INDEX
+        self._leaves = _NO_INDEX
+        self._num_leaves = 0
+        self._top = None
+        if cache_size > 0:
+            self._state().cache_size = cache_size
+
+    @property
+    def root(self) -> Any:
+        """The root of this prefix tree (see the class docstring)."""
+        if self._depth == -1:
+            return self._root
+        return self._root[:self._depth]
+
+    @root.setter
+    def root(self, root: Any) -> None:
+        """Set the root of this prefix tree to <root>."""
+        self._root = root
+        self._depth = len(root) if isinstance(root, list) else -1
 
     def is_empty(self) -> bool:
         """Return whether this simple prefix tree is empty."""
@@ -142,14 +384,31 @@ class SimplePrefixTree(Autocompleter):
 
         Note that this is a different definition than how we calculate __len__
         of regular trees from lecture!
+
+        The count is maintained by insert and remove, so this takes constant time.
         """
-        leaves = 0
-        for item in self.subtrees:
-            if item.is_leaf():
-                leaves += 1
-            elif self.weight > 0:
-                leaves += len(item)
-        return leaves
+        return self._num_leaves
+
+    def generation(self) -> int:
+        """Return the number of times the values or weights stored in this
+        prefix tree have been changed (by insert, bulk_load, remove, decay or
+        compact).
+        """
+        return self._state().generation
+
+    def _state(self) -> _TreeState:
+        """Return the _TreeState of this tree, creating it if necessary.
+
+        The state is kept once per whole tree, in the _root list of its root,
+        rather than in a slot of every subtree. A subtree of another tree
+        (which is never the one whose methods are called by clients) gets a
+        new default state that is not stored anywhere.
+        """
+        if self._depth != 0:
+            return _TreeState()
+        if not self._root:
+            self._root.append(_TreeState())
+        return self._root[0]
 
     ###########################################################################
     # Extra helper methods
@@ -195,47 +454,619 @@ class SimplePrefixTree(Autocompleter):
             1) not in this Autocompleter, or
             2) was previously inserted with the SAME prefix sequence
         """
-        if not prefix:
-            self.update_existing_value(value, weight)
+        state = self._state()
+        state.generation += 1
+        # Convert <weight> to the units of the weights stored in this tree
+        weight /= state.scale
+        path = self._insert_path(prefix)
+        self.weight += weight
+        for i in range(1, len(path)):
+            _move_up(path[i - 1].subtrees, path[i], weight)
+        if path[-1].update_existing_value(value, weight):
+            for subtree in path:
+                subtree._num_leaves += 1
+
+        if state.cache_size > 0:
+            leaf_weight = None
+            for subtree in path:
+                if subtree._top is not None:
+                    if leaf_weight is None:
+                        leaf = path[-1]._find_leaf(value)
+                        assert leaf is not None
+                        leaf_weight = leaf.weight
+                    _update_top(subtree._top, value, leaf_weight, state.cache_size)
+
+    def _insert_path(self, prefix: list) -> list[SimplePrefixTree]:
+        """Return the non-leaf subtrees on the path from this tree down to the
+        subtree whose root is <prefix>, creating any that are missing.
+
+        The path is walked with an index into <prefix> rather than by
+        recursing on slices of it, so long prefixes neither copy the prefix at
+        every level nor run into Python's recursion limit.
+        """
+        path = [self]
+        tree = self
+        shared_root = None
+        for i in range(self._depth, len(prefix)):
+            subtree = tree._find_child(prefix[i])
+            if subtree is None:
+                # The next element of the prefix is not found, so create a new subtree
+                if shared_root is None:
+                    shared_root = list(prefix)
+                subtree = type(self)()
+                subtree._root = shared_root
+                subtree._depth = i + 1
+                tree._add_child(subtree)
+            path.append(subtree)
+            tree = subtree
+        return path
+
+    def update_existing_value(self, value: Any, weight: float) -> bool:
+        """ Helper for insert(): add <weight> to the leaf storing <value>,
+        creating that leaf if <value> is not yet a subtree of this tree.
+
+        Return whether a new leaf was created. This does not update the weight
+        or leaf count of this tree itself.
+        """
+        leaf = self._find_leaf(value)
+        if leaf is not None:
+            _move_up(self.subtrees, leaf, weight)
+            return False
+
+        # If the value is not found, create a new subtree for it
+        new_subtree = type(self)()
+        new_subtree.root = value
+        new_subtree.subtrees = _NO_SUBTREES
+        new_subtree._num_leaves = 1
+        self._add_child(new_subtree)
+        try:
+            if self._leaves is _NO_INDEX:
+                self._leaves = {}
+            self._leaves[value] = new_subtree
+        except TypeError:
+            pass  # Unhashable values are found by _find_leaf's linear scan instead
+        # Its weight starts at 0.0, so it is in place at the back until moved up
+        _move_up(self.subtrees, new_subtree, weight)
+        return True
+
+    def bulk_load(self, entries: Iterable[tuple[Any, float, list]]) -> None:
+        """Insert each (value, weight, prefix) tuple in <entries> into this
+        Autocompleter, exactly as if insert were called for each of them in turn.
+
+        If this tree is empty, the tree is built bottom-up in a single pass
+        instead: the weights of repeated values are added up first, and the
+        entries are sorted by prefix, so that each subtree is created once and
+        its weight and subtree order are computed once, when it is complete.
+
+        Preconditions:
+        - every tuple in <entries> satisfies the preconditions of insert
+        - the values in <entries> are hashable
+        - the elements of all the prefixes in <entries> can be compared with <
+        """
+        if not self.is_empty():
+            super().bulk_load(entries)
             return
+        self._top = None
+        state = self._state()
+        state.generation += 1
+        state.scale = 1.0
 
-        for subtree in self.subtrees:
-            if subtree.root == [prefix[0]]:
-                if len(prefix) == 1:
-                    subtree.update_existing_value(value, weight)
+        # Map each value to its total weight and its prefix
+        totals: dict[Any, list[Any]] = {}
+        for value, weight, prefix in entries:
+            if value in totals:
+                totals[value][0] += weight
+            else:
+                totals[value] = [weight, prefix]
+        # Map each prefix to the (value, weight) tuples with that prefix
+        leaves = {}
+        for value, (weight, prefix) in totals.items():
+            leaves.setdefault(tuple(prefix), []).append((value, weight))
+
+        # <stack> holds the incomplete subtrees on the path to the last prefix,
+        # whose subtrees are added as they are completed.
+        stack = [self]
+        previous = ()
+        for prefix in sorted(leaves):
+            common = _common_length(previous, prefix)
+            while stack[-1]._depth > common:
+                subtree = stack.pop()
+                subtree._complete()
+                if stack[-1]._depth < common:
+                    # The prefixes branch partway along the edge to <subtree>
+                    # (only in a CompressedPrefixTree), so a new subtree starts there.
+                    middle = type(self)()
+                    middle._root = subtree._root
+                    middle._depth = common
+                    middle.subtrees = [subtree]
+                    stack.append(middle)
                 else:
-                    subtree.insert(value, weight, prefix[1:])
-                subtree.weight += weight  # Update the weight of the subtree
-                return
+                    stack[-1].subtrees.append(subtree)
+
+            self._extend_stack(stack, prefix)
+            tree = stack[-1]
+            for value, weight in leaves[prefix]:
+                leaf = type(self)()
+                leaf.root = value
+                leaf.weight = weight
+                leaf.subtrees = _NO_SUBTREES
+                leaf._num_leaves = 1
+                tree.subtrees.append(leaf)
+                if tree._leaves is _NO_INDEX:
+                    tree._leaves = {}
+                tree._leaves[value] = leaf
+            previous = prefix
+
+        while len(stack) > 1:
+            subtree = stack.pop()
+            subtree._complete()
+            stack[-1].subtrees.append(subtree)
+        self._complete()
+
+    def _extend_stack(self, stack: list[SimplePrefixTree], prefix: tuple) -> None:
+        """Push new subtrees onto <stack> (used by bulk_load) down to a subtree
+        whose root is <prefix>.
+
+        Preconditions:
+        - stack[-1].root is a prefix of <prefix>
+        """
+        shared_root = list(prefix)
+        for depth in range(stack[-1]._depth + 1, len(prefix) + 1):
+            subtree = type(self)()
+            subtree._root = shared_root
+            subtree._depth = depth
+            stack.append(subtree)
+
+    def _complete(self) -> None:
+        """Compute the weight, leaf count, subtree order and child index of this
+        tree from its subtrees, which are all complete (used by bulk_load).
+        """
+        if len(self.subtrees) == 1:
+            # The common case, in the long chains of subtrees of a SimplePrefixTree
+            self.weight = self.subtrees[0].weight
+            self._num_leaves = self.subtrees[0]._num_leaves
+            return
+        self.weight = sum((subtree.weight for subtree in self.subtrees), 0.0)
+        self._num_leaves = sum(subtree._num_leaves for subtree in self.subtrees)
+        self.subtrees.sort(key=_negated_weight)
+        if len(self.subtrees) > _MAX_UNINDEXED:
+            self._index_children()
+
+    def _find_leaf(self, value: Any) -> SimplePrefixTree | None:
+        """Return the leaf subtree of this tree whose root is <value>, or None
+        if there is no such leaf.
+        """
+        try:
+            return self._leaves.get(value)
+        except TypeError:
+            for subtree in self.subtrees:
+                if subtree.is_leaf() and subtree.root == value:
+                    return subtree
+            return None
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        This returns the <limit> matches with the *largest* weights: subtrees
+        are explored best-first by weight, so only the subtrees that could
+        contain one of those matches are visited.
 
-        # If the first element of the prefix is not found, create a new subtree
-        new_subtree = SimplePrefixTree()
-        new_subtree.root = [prefix[0]]
-        if len(prefix) == 1:
-            new_subtree.update_existing_value(value, weight)
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        path = self._path_to(prefix)
+        if path is None:
+            return []
+        return self._cursor_complete(path[-1], limit)
+
+    def _cursor_start(self) -> SimplePrefixTree:
+        """Return the state of an AutocompleteCursor whose prefix is empty.
+
+        The state of a cursor for a prefix tree is the subtree returned last by
+        _path_to for its prefix (or None if there is none).
+        """
+        return self
+
+    def _cursor_step(self, state: SimplePrefixTree, depth: int,
+                     element: Any) -> SimplePrefixTree | None:
+        """Return the state of a cursor whose prefix is the prefix of length
+        <depth> with state <state>, followed by <element>.
+
+        Preconditions:
+        - state is not None
+        """
+        if depth < state._depth:
+            # The prefix ends partway along the edge to <state>
+            return state if state._root[depth] == element else None
+        return state._find_child(element)
+
+    def _cursor_complete(self, state: SimplePrefixTree,
+                         limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix with state <state>: the
+        leaves of the subtree <state> with the largest weights, taken from its
+        cached top matches if <limit> is at most this tree's cache size.
+
+        Preconditions:
+        - state is not None
+        - limit is None or limit > 0
+        """
+        cache_size = self._state().cache_size
+        if limit is None or limit > cache_size:
+            return self._actual_weights(_top_k([state], limit))
+        if state._top is None:
+            state._top = _top_k([state], cache_size)
+        return self._actual_weights(state._top[:limit])
+
+    def _actual_weights(self, matches: list[tuple[Any, float]]) -> list[tuple[Any, float]]:
+        """Return the (value, weight) tuples <matches>, with each weight stored
+        in this tree converted to the actual weight of its value.
+        """
+        scale = self._state().scale
+        if scale == 1.0:
+            return matches
+        return [(value, weight * scale) for value, weight in matches]
+
+    def weight_of(self, value: Any, prefix: list) -> float:
+        """Return the weight of <value>, which was inserted with the prefix
+        sequence <prefix>, or 0.0 if <value> is not in this tree.
+
+        Only the path to the subtree whose root is <prefix> is walked, so this
+        takes time proportional to the length of <prefix>.
+        """
+        path = self._path_to(prefix)
+        if path is None or path[-1]._depth != len(prefix):
+            return 0.0
+        leaf = path[-1]._find_leaf(value)
+        if leaf is None:
+            return 0.0
+        return leaf.weight * self._state().scale
+
+    def fuzzy_autocomplete(self, prefix: list, max_distance: int,
+                           limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix, allowing up to
+        <max_distance> edits.
+
+        A value matches if some prefix of its prefix sequence is within
+        Levenshtein distance <max_distance> of <prefix>: that is, it can be
+        turned into <prefix> by at most <max_distance> insertions, deletions
+        and substitutions of single elements.
+
+        The return value is a list of tuples (value, weight), sorted by
+        non-increasing weight, as for autocomplete.
+
+        The tree is walked depth-first, computing one row of the edit distance
+        table for each prefix element along the way, and a subtree is skipped
+        as soon as every entry of its row is over <max_distance>. The highest
+        subtrees whose roots are close enough to <prefix> are then searched
+        best-first together, as autocomplete searches one subtree.
+
+        Preconditions:
+        - max_distance >= 0
+        - limit is None or limit > 0
+        """
+        row = list(range(len(prefix) + 1))
+        if row[-1] <= max_distance:
+            return self._actual_weights(_top_k([self], limit))
+
+        matches = []
+        # Stack entries are (tree, the edit distance row for tree.root)
+        stack = [(self, row)]
+        while stack:
+            tree, row = stack.pop()
+            for subtree in tree.subtrees:
+                if subtree.subtrees is _NO_SUBTREES:
+                    continue
+                subtree_row = row
+                for i in range(tree._depth, subtree._depth):
+                    subtree_row = _next_distance_row(subtree_row, prefix, subtree._root[i])
+                    if subtree_row[-1] <= max_distance or min(subtree_row) > max_distance:
+                        break
+                if subtree_row[-1] <= max_distance:
+                    matches.append(subtree)
+                elif min(subtree_row) <= max_distance:
+                    stack.append((subtree, subtree_row))
+        return self._actual_weights(_top_k(matches, limit))
+
+    def remove(self, prefix: list) -> None:
+        """Remove all values that match the given prefix.
+
+        Subtrees that are left without any values are removed as well.
+
+        The subtree matching <prefix> is detached in one pass back up its path:
+        its weight and leaf count are subtracted from each ancestor, and each
+        ancestor is moved back into place among its siblings by binary search.
+        So the running time depends on the depth of the subtree and the number
+        of subtrees of its ancestors, but not on how many values are removed.
+        """
+        path = self._path_to(prefix)
+        if path is None:
+            return
+        self._state().generation += 1
+        if len(path) == 1:
+            # Every value in this tree matches the prefix
+            self._clear()
+            return
+
+        removed = path[-1]
+        path[-2]._detach(removed)
+        for i in range(len(path) - 2, 0, -1):
+            tree = path[i]
+            if tree._num_leaves == removed._num_leaves:
+                # <tree> is left without any values
+                path[i - 1]._detach(tree)
+                continue
+            # Find <tree> among its siblings before its weight changes
+            index = _index_of(path[i - 1].subtrees, tree)
+            tree._top = None
+            tree._subtract_weight(removed.weight)
+            tree._num_leaves -= removed._num_leaves
+            _move_down(path[i - 1].subtrees, index)
+            path[i - 1]._merge_into_parent(tree)
+
+        if self._num_leaves == removed._num_leaves:
+            # Subtracting could leave a rounding error behind as the weight
+            self._clear()
         else:
-            new_subtree.insert(value, weight, prefix[1:])
-        self.subtrees.append(new_subtree)
-        self.weight += weight  # Update the weight of the main tree
+            self._top = None
+            self._subtract_weight(removed.weight)
+            self._num_leaves -= removed._num_leaves
+
+    def _detach(self, subtree: SimplePrefixTree) -> None:
+        """Remove the non-leaf <subtree> from this tree's subtrees.
+
+        This does not update the weight or leaf count of this tree. (Since
+        remove detaches subtrees left without values before updating their
+        weights, <subtree> may have no subtrees left but a positive weight, so
+        the precondition below is checked instead of not subtree.is_leaf().)
 
-    def update_existing_value(self, value: Any, weight: float) -> None:
-        """ Helper for insert() """
+        Preconditions:
+        - subtree in self.subtrees
+        - subtree.subtrees is not _NO_SUBTREES
+        - self.subtrees is sorted in non-increasing order of weight
+        """
+        self._remove_child(subtree)
+
+    def _merge_into_parent(self, subtree: SimplePrefixTree) -> None:
+        """Restore any representation invariants of this tree's subclass that
+        removing values from its non-leaf <subtree> may have broken.
+
+        A SimplePrefixTree has no such invariants, so this does nothing.
+
+        Preconditions:
+        - subtree in self.subtrees
+        """
+
+    def decay(self, factor: float) -> None:
+        """Multiply the weight of every value in this tree by <factor>.
+
+        Calling this regularly (for example, with a factor of
+        0.5 ** (elapsed time / half-life)) makes values inserted recently
+        outrank values that were only popular long ago.
+
+        Since every weight is multiplied by the same factor, the order of the
+        subtrees does not change: only the scale of the stored weights does,
+        so this takes constant time. (Once the scale gets very small, every
+        stored weight is multiplied by it instead, so that later inserts do
+        not overflow; values whose weights would round to 0.0 are removed.)
+
+        Preconditions:
+        - 0 < factor <= 1
+        """
+        state = self._state()
+        state.generation += 1
+        state.scale *= factor
+        if state.scale < _MIN_SCALE:
+            self._compact_stored(sys.float_info.min / state.scale)
+            stack = [self]
+            while stack:
+                tree = stack.pop()
+                tree.weight *= state.scale
+                tree._top = None
+                if tree.subtrees is not _NO_SUBTREES:
+                    stack.extend(tree.subtrees)
+            state.scale = 1.0
+
+    def compact(self, threshold: float) -> None:
+        """Remove every value whose weight is less than <threshold>, along with
+        the subtrees that are left without any values.
+
+        A subtree lighter than <threshold> can only contain values lighter than
+        <threshold>, and each subtrees list is sorted by weight, so all of the
+        subtrees of a tree that are too light are dropped at once, without
+        being visited. Only the subtrees weighing at least <threshold> are
+        visited, so after decay has made most values negligible this takes
+        time proportional to the popular part of the tree.
+
+        Preconditions:
+        - threshold > 0
+        """
+        if not self.is_empty():
+            state = self._state()
+            state.generation += 1
+            self._compact_stored(threshold / state.scale)
+
+    def _compact_stored(self, threshold: float) -> None:
+        """Remove every value whose weight *as stored in this tree* is less
+        than <threshold>, along with the subtrees left without any values.
+        """
+        # Visit the subtrees heavy enough to keep, parents before children
+        visited = []
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            visited.append(tree)
+            kept = bisect.bisect_right(tree.subtrees, -threshold, key=_negated_weight)
+            tree._drop_subtrees(kept)
+            stack.extend(subtree for subtree in tree.subtrees
+                         if subtree.subtrees is not _NO_SUBTREES)
+
+        # Update them children first, dropping the subtrees left without values
+        for tree in reversed(visited):
+            tree.subtrees.sort(key=_negated_weight)
+            tree._drop_subtrees(bisect.bisect_left(tree.subtrees, 0.0, key=_negated_weight))
+            for subtree in tree.subtrees:
+                if subtree.subtrees is not _NO_SUBTREES:
+                    tree._merge_into_parent(subtree)
+            tree.weight = sum((subtree.weight for subtree in tree.subtrees), 0.0)
+            tree._num_leaves = sum(subtree._num_leaves for subtree in tree.subtrees)
+            tree._top = None
+
+        if self._num_leaves == 0:
+            self._clear()
+
+    def _clear(self) -> None:
+        """Make this tree empty."""
+        if self._depth != 0:
+            self.root = []
+        self.weight = 0.0
+        self.subtrees = []
+        self._children = _NO_INDEX
+        self._leaves = _NO_INDEX
+        self._num_leaves = 0
+        self._top = None
+        self._state().scale = 1.0
+
+    def _path_to(self, prefix: list) -> list[SimplePrefixTree] | None:
+        """Return the subtrees on the path from this tree down to the subtree
+        whose leaves are exactly the values matching <prefix>, or None if no
+        value matches <prefix>.
+
+        The root of the last subtree may be longer than <prefix> (this happens
+        in a CompressedPrefixTree when <prefix> ends partway along the edge to
+        a subtree).
+        """
+        path = [self]
+        tree = self
+        i = self._depth
+        while i < len(prefix):
+            subtree = tree._find_child(prefix[i])
+            if subtree is None:
+                return None
+            # A subtree's root may extend its parent's root by several elements
+            for j in range(i + 1, min(subtree._depth, len(prefix))):
+                if subtree._root[j] != prefix[j]:
+                    return None
+            path.append(subtree)
+            tree = subtree
+            i = subtree._depth
+        return path
+
+    def _find_child(self, element: Any) -> SimplePrefixTree | None:
+        """Return the non-leaf subtree of this tree whose root extends self.root
+        with <element> next, or None if there is no such subtree.
+        """
+        if self._children is not _NO_INDEX:
+            return self._children.get(element)
+        depth = self._depth
         for subtree in self.subtrees:
-            if subtree.root == value[0]:  # Change this line to check the first element of value
-                subtree.weight += weight
-                return
+            if subtree.subtrees is not _NO_SUBTREES and subtree._root[depth] == element:
+                return subtree
+        return None
 
-        # If the value is not found, create a new subtree for it
-        new_subtree = SimplePrefixTree()
-        new_subtree.root = value[0]  # Change this line to use the first element of value
-        new_subtree.weight = weight
-        self.subtrees.append(new_subtree)
+    def _add_child(self, subtree: SimplePrefixTree) -> None:
+        """Append <subtree> to self.subtrees, indexing it if it is not a leaf.
+
+        This does not restore the order of self.subtrees.
+        """
+        self.subtrees.append(subtree)
+        if self._children is not _NO_INDEX:
+            if subtree.subtrees is not _NO_SUBTREES:
+                self._children[subtree._root[self._depth]] = subtree
+        elif len(self.subtrees) > _MAX_UNINDEXED:
+            self._index_children()
+
+    def _index_children(self) -> None:
+        """Build the dict index of the non-leaf subtrees of this tree."""
+        depth = self._depth
+        self._children = {child._root[depth]: child for child in self.subtrees
+                          if child.subtrees is not _NO_SUBTREES}
+
+    def _replace_child(self, old: SimplePrefixTree, new: SimplePrefixTree) -> None:
+        """Replace the non-leaf subtree <old> of this tree with the non-leaf
+        subtree <new>.
+
+        Preconditions:
+        - self.subtrees is sorted in non-increasing order of weight
+        - old.weight == new.weight, so that self.subtrees stays sorted
+        - old.root[len(self.root)] == new.root[len(self.root)]
+        """
+        self.subtrees[_index_of(self.subtrees, old)] = new
+        if self._children is not _NO_INDEX:
+            self._children[new._root[self._depth]] = new
+
+    def _remove_child(self, subtree: SimplePrefixTree) -> None:
+        """Remove the non-leaf <subtree> from self.subtrees and its index.
+
+        Preconditions:
+        - self.subtrees is sorted in non-increasing order of weight
+        """
+        self.subtrees.pop(_index_of(self.subtrees, subtree))
+        if self._children is not _NO_INDEX:
+            del self._children[subtree._root[self._depth]]
+
+    def _drop_subtrees(self, start: int) -> None:
+        """Remove self.subtrees[start:] from self.subtrees and from its indexes.
+
+        This does not update the weight or leaf count of this tree.
+        """
+        for subtree in self.subtrees[start:]:
+            if subtree.subtrees is not _NO_SUBTREES:
+                if self._children is not _NO_INDEX:
+                    del self._children[subtree._root[self._depth]]
+            elif self._leaves is not _NO_INDEX:
+                try:
+                    self._leaves.pop(subtree._root, None)
+                except TypeError:
+                    pass  # Unhashable values are not in _leaves
+        del self.subtrees[start:]
+
+    def _subtract_weight(self, weight: float) -> None:
+        """Subtract <weight> from self.weight, once the subtrees of this tree
+        have been updated for the removal of that weight.
+
+        >>> tree = SimplePrefixTree()
+        >>> tree.insert('new', 1e20, ['n'])
+        >>> tree.insert('old', 1.0, ['o'])
+        >>> tree.remove(['n'])
+        >>> tree.weight
+        1.0
+        """
+        remaining = self.weight - weight
+        if remaining < self.weight * _MIN_REMAINING:
+            remaining = sum((subtree.weight for subtree in self.subtrees), 0.0)
+        self.weight = remaining
+
+    def freeze(self) -> FrozenPrefixTree:
+        """Return a read-only copy of this tree, packed into flat arrays.
+
+        Later changes to this tree do not affect the returned copy.
+        """
+        return FrozenPrefixTree(self)
+
+    def save(self, path: str | os.PathLike, codec: ValueCodec | None = None) -> None:
+        """Write the values stored in this tree, with their weights and
+        prefixes, to the file at <path>, which FrozenPrefixTree.load can read.
+
+        The values are written by <codec> (a PickleCodec if <codec> is None).
+
+        Preconditions:
+        - every value stored in this tree can be encoded by <codec>
+        - every prefix element stored in this tree is a str, or an int that
+          fits in 64 bits
+        """
+        self.freeze().save(path, codec)
 
 
 ################################################################################
 # CompressedPrefixTree (Part 6)
 ################################################################################
-@check_contracts
+@check_contracts_if_enabled
 class CompressedPrefixTree(SimplePrefixTree):
     """A compressed prefix tree implementation.
 
@@ -248,10 +1079,967 @@ class CompressedPrefixTree(SimplePrefixTree):
     - (NEW) This tree does not contain any compressible internal values.
     """
     subtrees: list[CompressedPrefixTree]  # Note the different type annotation
+    __slots__ = ()
 
     ###########################################################################
     # Add code for Part 6 here
     ###########################################################################
+    def _insert_path(self, prefix: list) -> list[CompressedPrefixTree]:
+        """Return the non-leaf subtrees on the path from this tree down to the
+        subtree whose root is <prefix>, creating any that are missing.
+
+        Unlike in a SimplePrefixTree, the root of a subtree may extend its
+        parent's root by several elements. If <prefix> leaves such an edge
+        partway along, the edge is split by a new subtree whose root is the
+        part of <prefix> that the edge agrees with.
+        """
+        path = [self]
+        tree = self
+        i = self._depth
+        while i < len(prefix):
+            subtree = tree._find_child(prefix[i])
+            if subtree is None:
+                # No subtree shares the next element, so a single new subtree
+                # holds the rest of the prefix.
+                subtree = type(self)()
+                subtree.root = list(prefix)
+                tree._add_child(subtree)
+                path.append(subtree)
+                return path
+
+            j = i + 1
+            end = min(subtree._depth, len(prefix))
+            while j < end and subtree._root[j] == prefix[j]:
+                j += 1
+            if j < subtree._depth:
+                subtree = tree._split(subtree, j)
+            path.append(subtree)
+            tree = subtree
+            i = j
+        return path
+
+    def _split(self, subtree: CompressedPrefixTree, length: int) -> CompressedPrefixTree:
+        """Replace the non-leaf <subtree> of this tree with a new subtree whose
+        root is the first <length> elements of subtree.root, and whose only
+        subtree is <subtree>. Return the new subtree.
+
+        Preconditions:
+        - subtree in self.subtrees
+        - len(self.root) < length < len(subtree.root)
+        """
+        middle = type(self)()
+        # <middle>'s root is a prefix of <subtree>'s, so they share storage
+        middle._root = subtree._root
+        middle._depth = length
+        middle.weight = subtree.weight
+        middle._num_leaves = subtree._num_leaves
+        middle.subtrees = [subtree]
+
+        self._replace_child(subtree, middle)
+        return middle
+
+    def _extend_stack(self, stack: list[CompressedPrefixTree], prefix: tuple) -> None:
+        """Push a new subtree whose root is <prefix> onto <stack> (used by
+        bulk_load), unless stack[-1] already has that root.
+
+        Preconditions:
+        - stack[-1].root is a prefix of <prefix>
+        """
+        if stack[-1]._depth < len(prefix):
+            subtree = type(self)()
+            subtree.root = list(prefix)
+            stack.append(subtree)
+
+    def _merge_into_parent(self, subtree: CompressedPrefixTree) -> None:
+        """Replace the non-leaf <subtree> of this tree with its own subtree
+        if that is its only subtree and is not a leaf, since <subtree> would
+        then be a compressible internal value.
+
+        Preconditions:
+        - subtree in self.subtrees
+        """
+        if len(subtree.subtrees) == 1 and not subtree.subtrees[0].is_leaf():
+            self._replace_child(subtree, subtree.subtrees[0])
+
+
+################################################################################
+# FrozenPrefixTree
+################################################################################
+@check_contracts_if_enabled
+class FrozenPrefixTree(Autocompleter):
+    """A read-only prefix tree packed into flat parallel arrays.
+
+    A FrozenPrefixTree is made by SimplePrefixTree.freeze (or
+    CompressedPrefixTree.freeze) and answers autocomplete and fuzzy_autocomplete
+    exactly as the tree it was made from did at that time, but it stores each
+    subtree as a few array entries rather than as a Python object.
+
+    The subtrees are numbered in breadth-first order, with the root numbered 0
+    and the subtrees of each tree in the same order as its subtrees list. So
+    the subtrees of each tree have consecutive numbers, and are still sorted in
+    non-increasing order of weight.
+
+    Prefix elements are stored as label ids, indexes into a table of the
+    distinct prefix elements in the tree.
+
+    A FrozenPrefixTree can be saved to a file, and loaded back with
+    FrozenPrefixTree.load. A loaded tree reads its arrays straight from the
+    memory-mapped file, and unpickles each value only when autocomplete returns
+    it, so loading takes about the same time however large the tree is, and
+    processes that load the same file share its pages. Call close (or use the
+    loaded tree in a with statement) to unmap the file once the tree is no
+    longer needed.
+
+    Representation Invariants:
+    - len(self._child_start) == len(self._weights) + 1
+    - len(self._label_start) == len(self._weights) + 1
+    - len(self._value_ids) == len(self._weights)
+    - len(self._label_order) == len(self._weights)
+    """
+    # Private Instance Attributes:
+    # - _child_start:
+    #     The subtrees of subtree n are numbered _child_start[n] to
+    #     _child_start[n + 1] - 1.
+    # - _label_start, _labels:
+    #     The label ids of the prefix elements that subtree n adds to its
+    #     parent's root are _labels[_label_start[n]:_label_start[n + 1]].
+    #     (This is empty for leaves, and the root.)
+    # - _label_order:
+    #     For each tree n, the numbers of its subtrees from _child_start[n]
+    #     to _child_start[n + 1] - 1, rearranged so that its non-leaf subtrees
+    #     come first, in increasing order of their first label id. This lets
+    #     a non-leaf subtree be found by binary search. (_label_order[0] is
+    #     the root.)
+    # - _weights:
+    #     The weight of each subtree.
+    # - _value_ids:
+    #     The index in _values of the value stored in each leaf, or -1 for
+    #     non-leaf subtrees.
+    # - _values:
+    #     The values stored in this tree. (For a loaded tree, a sequence
+    #     returned by ValueCodec.decode, which reads them from the file.)
+    # - _label_ids:
+    #     Maps each distinct prefix element in this tree to its label id.
+    # - _mmap:
+    #     The memory-mapped file that a loaded tree was read from, or None.
+    # - _sections:
+    #     The memoryviews of _mmap that a loaded tree holds itself (empty for
+    #     a tree made by freeze).
+    # The arrays are memoryviews of the file for a loaded tree.
+    _child_start: array | memoryview
+    _label_start: array | memoryview
+    _labels: array | memoryview
+    _label_order: array | memoryview
+    _weights: array | memoryview
+    _value_ids: array | memoryview
+    _values: Sequence
+    _label_ids: dict[Any, int]
+    _mmap: mmap.mmap | None
+    _sections: list[memoryview]
+
+    def __init__(self, tree: SimplePrefixTree) -> None:
+        """Initialize a read-only copy of <tree>, packed into flat arrays."""
+        self._child_start = array('i')
+        self._label_start = array('i', [0])
+        self._labels = array('i')
+        self._label_order = array('i', [0])
+        self._weights = array('d')
+        self._value_ids = array('i')
+        self._values = []
+        self._label_ids = {}
+        self._mmap = None
+        self._sections = []
+
+        # Queue entries are (subtree, length of its parent's root)
+        queue = collections.deque([(tree, 0)])
+        next_number = 1
+        while queue:
+            subtree, parent_depth = queue.popleft()
+            self._weights.append(subtree.weight * tree._state().scale)
+            if subtree.subtrees is _NO_SUBTREES:
+                self._value_ids.append(len(self._values))
+                self._values.append(subtree.root)
+            else:
+                self._value_ids.append(-1)
+                for i in range(parent_depth, subtree._depth):
+                    self._labels.append(
+                        self._label_ids.setdefault(subtree._root[i], len(self._label_ids)))
+            self._label_start.append(len(self._labels))
+
+            self._child_start.append(next_number)
+            firsts = []
+            for child in subtree.subtrees:
+                queue.append((child, subtree._depth))
+                if child.subtrees is _NO_SUBTREES:
+                    firsts.append((1, 0, next_number))
+                else:
+                    first = self._label_ids.setdefault(child._root[subtree._depth],
+                                                       len(self._label_ids))
+                    firsts.append((0, first, next_number))
+                next_number += 1
+            self._label_order.extend(number for _, _, number in sorted(firsts))
+        self._child_start.append(next_number)
+
+    @staticmethod
+    def load(path: str | os.PathLike, codec: ValueCodec | None = None) -> FrozenPrefixTree:
+        """Return the prefix tree saved to the file at <path> with the given
+        codec (a PickleCodec if <codec> is None), read from the file by
+        memory-mapping it.
+
+        Raise ValueError if the file was not written by save with the same kind
+        of codec on a machine with the same byte order.
+
+        With a PickleCodec, each value is unpickled from the file when it is
+        accessed, and unpickling can run arbitrary code, so only load files
+        from a trusted source with it.
+        """
+        if codec is None:
+            codec = PickleCodec()
+        with open(path, 'rb') as f:
+            file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with memoryview(file) as buffer:
+            try:
+                nodes, labels, values, values_size, table_size = _unpack_header(
+                    buffer, path, codec)
+            except ValueError:
+                buffer.release()
+                file.close()
+                raise
+            sections, _ = unpack_sections(buffer, _HEADER.size, [
+                ('i', nodes + 1), ('i', nodes + 1), ('i', labels), ('i', nodes), ('d', nodes),
+                ('i', nodes), ('B', values_size), ('B', table_size)
+            ])
+
+        tree = FrozenPrefixTree.__new__(FrozenPrefixTree)
+        (tree._child_start, tree._label_start, tree._labels, tree._label_order,
+         tree._weights, tree._value_ids, values_data, table) = sections
+        tree._values = codec.decode(values_data, values)
+        tree._label_ids = {label: i for i, label in enumerate(_decode_labels(table))}
+        tree._mmap = file
+        tree._sections = sections
+        return tree
+
+    def close(self) -> None:
+        """Unmap the file that this tree was loaded from by load, after which
+        this tree is empty. This does nothing to a tree made by freeze.
+
+        Raise BufferError if something other than this tree still holds a view
+        of the file, such as a sequence of values returned by the codec's
+        decode that has not been freed.
+        """
+        if self._mmap is None:
+            return
+        for view in self._sections:
+            view.release()
+        # The arrays of a frozen empty tree, which hold no views of the file
+        self._child_start = array('i', [1, 1])
+        self._label_start = array('i', [0, 0])
+        self._labels = array('i')
+        self._label_order = array('i', [0])
+        self._weights = array('d', [0.0])
+        self._value_ids = array('i', [-1])
+        # Freeing the values frees the views of the file that the codec made
+        self._values = []
+        self._label_ids = {}
+        self._sections = []
+        file, self._mmap = self._mmap, None
+        file.close()
+
+    def __enter__(self) -> FrozenPrefixTree:
+        """Return this tree, which is closed when the with statement ends."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this tree."""
+        self.close()
+
+    def save(self, path: str | os.PathLike, codec: ValueCodec | None = None) -> None:
+        """Write this tree to the file at <path>, which load can read, using the
+        given codec to write its values (a PickleCodec if <codec> is None).
+
+        A file written with a PickleCodec should only be loaded by someone who
+        trusts its source, since loading it unpickles the values (see load).
+
+        Preconditions:
+        - every value stored in this tree can be encoded by <codec>
+        - every prefix element stored in this tree is a str, or an int that
+          fits in 64 bits
+        """
+        if codec is None:
+            codec = PickleCodec()
+        values = codec.encode(self._values)
+        table = _encode_labels(list(self._label_ids))
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, sys.byteorder == 'little',
+                                 len(self._weights), len(self._labels), len(self._values),
+                                 len(values), len(table), codec.name.encode()))
+            f.write(pack_sections([self._child_start, self._label_start, self._labels,
+                                   self._label_order, self._weights, self._value_ids,
+                                   values, table]))
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this prefix tree."""
+        return len(self._values)
+
+    def generation(self) -> int:
+        """Return 0, since a FrozenPrefixTree is never changed."""
+        return 0
+
+    def insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def remove(self, prefix: list) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def decay(self, factor: float) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def compact(self, threshold: float) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), sorted by
+        non-increasing weight. It holds the <limit> matches with the largest
+        weights, found by the same best-first search as
+        SimplePrefixTree.autocomplete.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        number = self._locate(prefix)
+        if number == -1:
+            return []
+        return self._complete([number], limit)
+
+    def fuzzy_autocomplete(self, prefix: list, max_distance: int,
+                           limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix, allowing up to
+        <max_distance> edits.
+
+        A value matches if some prefix of its prefix sequence is within
+        Levenshtein distance <max_distance> of <prefix>, as for
+        SimplePrefixTree.fuzzy_autocomplete. The search is the same too: one
+        row of the edit distance table is computed for each label along the
+        way, and a subtree is skipped as soon as every entry of its row is over
+        <max_distance>. Labels are compared by label id, so each element of
+        <prefix> is looked up in the label table only once.
+
+        Preconditions:
+        - max_distance >= 0
+        - limit is None or limit > 0
+        """
+        row = list(range(len(prefix) + 1))
+        if row[-1] <= max_distance:
+            return self._complete([0], limit)
+
+        # An element that is not in the label table matches no label
+        label_prefix = [self._label_ids.get(element, -1) for element in prefix]
+        matches = []
+        # Stack entries are (n, the edit distance row for the root of subtree n)
+        stack = [(0, row)]
+        while stack:
+            number, row = stack.pop()
+            for child in range(self._child_start[number], self._child_start[number + 1]):
+                if self._value_ids[child] != -1:
+                    continue
+                child_row = row
+                for j in range(self._label_start[child], self._label_start[child + 1]):
+                    child_row = _next_distance_row(child_row, label_prefix, self._labels[j])
+                    if child_row[-1] <= max_distance or min(child_row) > max_distance:
+                        break
+                if child_row[-1] <= max_distance:
+                    matches.append(child)
+                elif min(child_row) <= max_distance:
+                    stack.append((child, child_row))
+        return self._complete(matches, limit)
+
+    def _cursor_start(self) -> tuple[int, int]:
+        """Return the state of an AutocompleteCursor whose prefix is empty.
+
+        The state of a cursor for a FrozenPrefixTree is a pair (n, depth),
+        where subtree n is the subtree _locate returns for the cursor's prefix,
+        and depth is the length of the root of subtree n.
+        """
+        return 0, self._label_start[1] - self._label_start[0]
+
+    def _cursor_step(self, state: tuple[int, int], depth: int,
+                     element: Any) -> tuple[int, int] | None:
+        """Return the state of a cursor whose prefix is the prefix of length
+        <depth> with state <state>, followed by <element>.
+
+        Preconditions:
+        - state is not None
+        """
+        number, root_depth = state
+        if depth < root_depth:
+            # The prefix ends partway along the labels of subtree <number>
+            label = self._labels[self._label_start[number + 1] - root_depth + depth]
+            return state if label == self._label_ids.get(element, -1) else None
+        child = self._find_child(number, element)
+        if child == -1:
+            return None
+        return child, depth + self._label_start[child + 1] - self._label_start[child]
+
+    def _cursor_complete(self, state: tuple[int, int],
+                         limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix with state <state>.
+
+        Preconditions:
+        - state is not None
+        - limit is None or limit > 0
+        """
+        return self._complete([state[0]], limit)
+
+    def _complete(self, numbers: list[int], limit: int | None) -> list[tuple[Any, float]]:
+        """Return the (value, weight) tuples of up to <limit> of the leaves of
+        the subtrees numbered <numbers> with the largest weights, sorted by
+        non-increasing weight.
+
+        Preconditions:
+        - none of the subtrees numbered <numbers> is a subtree of another
+        - limit is None or limit > 0
+        """
+        matches = []
+        # Heap entries are (-weight, n, end) for subtree n, whose later
+        # siblings are numbered up to end - 1.
+        heap = [(-self._weights[number], number, number + 1) for number in numbers]
+        heapq.heapify(heap)
+        while heap and (limit is None or len(matches) < limit):
+            _, number, end = heapq.heappop(heap)
+            if number + 1 < end:
+                heapq.heappush(heap, (-self._weights[number + 1], number + 1, end))
+            if self._value_ids[number] != -1:
+                matches.append((self._values[self._value_ids[number]], self._weights[number]))
+            else:
+                first, end = self._child_start[number], self._child_start[number + 1]
+                if first < end:
+                    heapq.heappush(heap, (-self._weights[first], first, end))
+        return matches
+
+    def _locate(self, prefix: list) -> int:
+        """Return the number of the subtree whose leaves are exactly the values
+        matching <prefix>, or -1 if no value matches <prefix>.
+        """
+        number = 0
+        i = self._match_labels(0, prefix, 0)
+        while 0 <= i < len(prefix):
+            number = self._find_child(number, prefix[i])
+            if number == -1:
+                return -1
+            i = self._match_labels(number, prefix, i)
+        return number if i != -1 else -1
+
+    def _match_labels(self, number: int, prefix: list, i: int) -> int:
+        """Return the index in <prefix> just past the prefix elements that
+        subtree <number> adds to its parent's root, or -1 if those elements
+        disagree with <prefix> starting at index <i>.
+
+        The elements are only compared up to the end of <prefix>.
+        """
+        start, end = self._label_start[number], self._label_start[number + 1]
+        for j in range(start, min(end, start + len(prefix) - i)):
+            if self._labels[j] != self._label_ids.get(prefix[i + j - start], -1):
+                return -1
+        return i + end - start
+
+    def _find_child(self, number: int, element: Any) -> int:
+        """Return the number of the non-leaf subtree of subtree <number> whose
+        first prefix element after its parent's root is <element>, or -1 if
+        there is no such subtree.
+        """
+        label = self._label_ids.get(element, -1)
+        if label == -1:
+            return -1
+        # Binary search the non-leaf subtrees, which come first in _label_order
+        lo, hi = self._child_start[number], self._child_start[number + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            child = self._label_order[mid]
+            if self._value_ids[child] != -1 or self._labels[self._label_start[child]] >= label:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo < self._child_start[number + 1]:
+            child = self._label_order[lo]
+            if self._value_ids[child] == -1 and self._labels[self._label_start[child]] == label:
+                return child
+        return -1
+
+
+################################################################################
+# Cursors for autocompleting a prefix as it is typed
+################################################################################
+@check_contracts_if_enabled
+class AutocompleteCursor:
+    """A prefix for an Autocompleter that is extended and shortened one element
+    at a time, as in a search box where each keystroke types or deletes one
+    character.
+
+    The cursor keeps the subtree matching each prefix it has been extended
+    through, so push and pop take constant time instead of walking down from
+    the root of the tree, and autocomplete only searches below the current
+    subtree. If the Autocompleter changes, the cursor finds its subtrees again
+    the next time it is used.
+
+    Instance Attributes:
+    - autocompleter: The Autocompleter this cursor autocompletes from.
+    - prefix: The prefix of this cursor. Change it only through push and pop.
+
+    Representation Invariants:
+    - len(self._states) == len(self.prefix) + 1
+    """
+    # Private Instance Attributes:
+    # - _states:
+    #     The state (see Autocompleter._cursor_start) of each prefix of
+    #     self.prefix, from the empty prefix to self.prefix itself.
+    # - _generation:
+    #     The generation of self.autocompleter when _states was computed.
+    autocompleter: Autocompleter
+    prefix: list
+    _states: list
+    _generation: int
+
+    def __init__(self, autocompleter: Autocompleter) -> None:
+        """Initialize a cursor for <autocompleter> whose prefix is empty."""
+        self.autocompleter = autocompleter
+        self.prefix = []
+        self._states = [autocompleter._cursor_start()]
+        self._generation = autocompleter.generation()
+
+    def push(self, element: Any) -> None:
+        """Add <element> to the end of this cursor's prefix."""
+        self._refresh()
+        state = self._states[-1]
+        if state is not None:
+            state = self.autocompleter._cursor_step(state, len(self.prefix), element)
+        self._states.append(state)
+        self.prefix.append(element)
+
+    def pop(self) -> Any:
+        """Remove and return the last element of this cursor's prefix.
+
+        Preconditions:
+        - self.prefix != []
+        """
+        self._states.pop()
+        return self.prefix.pop()
+
+    def autocomplete(self, limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for this cursor's prefix, exactly as
+        self.autocompleter.autocomplete(self.prefix, limit) would.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        self._refresh()
+        if self._states[-1] is None:
+            return []
+        return self.autocompleter._cursor_complete(self._states[-1], limit)
+
+    def _refresh(self) -> None:
+        """Recompute the states of this cursor if its Autocompleter has changed
+        since they were computed.
+        """
+        generation = self.autocompleter.generation()
+        if generation == self._generation:
+            return
+        self._generation = generation
+        self._states = [self.autocompleter._cursor_start()]
+        for depth, element in enumerate(self.prefix):
+            state = self._states[-1]
+            if state is not None:
+                state = self.autocompleter._cursor_step(state, depth, element)
+            self._states.append(state)
+
+
+################################################################################
+# Value codecs for saved prefix trees
+################################################################################
+class ValueCodec:
+    """An abstract class for the ways in which FrozenPrefixTree.save can write
+    the values stored in a tree, and FrozenPrefixTree.load can read them.
+
+    Class Attributes:
+    - name: the name of this kind of codec, which is written to saved files
+      to check that they are loaded with the same kind of codec
+    """
+    name: str
+
+    def encode(self, values: Sequence) -> bytes:
+        """Return <values> encoded as bytes."""
+        raise NotImplementedError
+
+    def decode(self, data: memoryview, count: int) -> Sequence:
+        """Return the <count> values encoded in <data> by encode.
+
+        <data> may be a view of a memory-mapped file, which stays open as long
+        as the returned sequence refers to it.
+        """
+        raise NotImplementedError
+
+
+@check_contracts_if_enabled
+class PickleCodec(ValueCodec):
+    """A codec that pickles each value separately, so any value that can be
+    pickled can be saved. Values are unpickled each time they are accessed.
+
+    Unpickling can run arbitrary code, so a tree saved with this codec must
+    only be loaded from a file that nobody untrusted could have written.
+    """
+    name = 'pickle'
+
+    def encode(self, values: Sequence) -> bytes:
+        """Return <values> encoded as bytes."""
+        pickled = [pickle.dumps(value) for value in values]
+        offsets = array('q', [0])
+        for value in pickled:
+            offsets.append(offsets[-1] + len(value))
+        return pack_sections([offsets, b''.join(pickled)])
+
+    def decode(self, data: memoryview, count: int) -> Sequence:
+        """Return the <count> values encoded in <data> by encode."""
+        (offsets,), start = unpack_sections(data, 0, [('q', count + 1)])
+        return _StoredValues(data[start:], offsets)
+
+
+class _TreeState:
+    """The state of a whole SimplePrefixTree that is not needed by each of its
+    subtrees.
+
+    Instance Attributes:
+    - cache_size: the number K of top matches cached by the subtrees of the
+      tree, or 0 if they cache nothing
+    - generation: the number of calls to insert, bulk_load, remove, decay and
+      compact on the tree that have changed it (see Autocompleter.generation)
+    - scale: the factor by which the weights stored in the tree must be
+      multiplied to give the actual weights of their values. decay lowers it
+      rather than changing every weight; it is 1.0 until then.
+    """
+    __slots__ = ('cache_size', 'generation', 'scale')
+    cache_size: int
+    generation: int
+    scale: float
+
+    def __init__(self, cache_size: int = 0) -> None:
+        self.cache_size = cache_size
+        self.generation = 0
+        self.scale = 1.0
+
+
+class _StoredValues(Sequence):
+    """The values of a loaded FrozenPrefixTree, each unpickled from the file
+    when it is accessed.
+    """
+    # Private Instance Attributes:
+    # - _data: the pickled values, one after another
+    # - _offsets: value i is pickled in _data[_offsets[i]:_offsets[i + 1]]
+    _data: memoryview
+    _offsets: memoryview
+
+    def __init__(self, data: memoryview, offsets: memoryview) -> None:
+        """Initialize the values pickled in <data> at the given <offsets>."""
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        """Return the number of values."""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> Any:
+        """Return value <i>."""
+        if not 0 <= i < len(self):
+            raise IndexError('value index out of range')
+        return pickle.loads(self._data[self._offsets[i]:self._offsets[i + 1]])
+
+
+# The format of the files written by FrozenPrefixTree.save: a header of
+# (_MAGIC, _VERSION, whether the arrays are little-endian, the number of
+# subtrees, of labels and of values, the size of the encoded values and of the
+# label table, the name of the value codec), then the arrays of the tree, the
+# encoded values and the label table (see _encode_labels), each padded to a
+# multiple of _ALIGNMENT bytes.
+_HEADER = struct.Struct('<4sB?2x5q16s')
+_MAGIC = b'A2PT'
+_VERSION = 3
+_ALIGNMENT = 8
+
+
+def _unpack_header(buffer: memoryview, path: str | os.PathLike,
+                   codec: ValueCodec) -> tuple[int, int, int, int, int]:
+    """Return the numbers of subtrees, labels and values, and the sizes of the
+    encoded values and of the label table, from the header of the prefix tree
+    saved to the file at <path>, whose contents are <buffer>.
+
+    Raise ValueError if the file was not written by FrozenPrefixTree.save with
+    the same kind of codec as <codec> on a machine with the same byte order.
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f'{path} is not a saved prefix tree')
+    (magic, version, little_endian, nodes, labels, values, values_size, table_size,
+     codec_name) = _HEADER.unpack_from(buffer)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError(f'{path} is not a saved prefix tree')
+    if little_endian != (sys.byteorder == 'little'):
+        raise ValueError(f'{path} was saved on a machine with the other byte order')
+    if codec_name.rstrip(b'\0').decode() != codec.name:
+        raise ValueError(f'{path} was not saved with a {type(codec).__name__}')
+    return nodes, labels, values, values_size, table_size
+
+
+def pack_sections(sections: list) -> bytes:
+    """Return the given sections (bytes, or arrays) joined into one bytes
+    object, each padded with zero bytes to a multiple of 8 bytes long.
+
+    This and unpack_sections help ValueCodecs lay out the values they encode.
+
+    >>> pack_sections([array('i', [1, 2, 3]), b'ab'])[12:18]
+    b'\\x00\\x00\\x00\\x00ab'
+    """
+    parts = []
+    for section in sections:
+        data = memoryview(section).cast('B')
+        parts.append(data)
+        parts.append(bytes(_aligned(len(data)) - len(data)))
+    return b''.join(parts)
+
+
+def unpack_sections(data: memoryview, start: int, layout: list[tuple[str, int]]
+                    ) -> tuple[list[memoryview], int]:
+    """Return memoryviews of the sections packed by pack_sections from
+    offset <start> in <data>, given the array typecode (such as 'B' for bytes)
+    and length of each, and the offset in <data> just past them.
+
+    >>> data = memoryview(pack_sections([array('i', [1, 2, 3]), b'ab']))
+    >>> sections, end = unpack_sections(data, 0, [('i', 3), ('B', 2)])
+    >>> sections[0].tolist(), bytes(sections[1]), end
+    ([1, 2, 3], b'ab', 24)
+    """
+    views = []
+    for typecode, length in layout:
+        end = start + length * array(typecode).itemsize
+        views.append(data[start:end].cast(typecode))
+        start = _aligned(end)
+    return views, start
+
+
+def _encode_labels(labels: list) -> bytes:
+    """Return the prefix elements <labels> encoded for a saved prefix tree,
+    which _decode_labels can decode without unpickling anything.
+
+    The encoding is the number of labels, then whether each label is a str,
+    then each int label (or the end offset of each str label in the text that
+    follows), then the UTF-8 text of the str labels.
+
+    >>> _decode_labels(memoryview(_encode_labels(['a', 3, 'bc', -1])))
+    ['a', 3, 'bc', -1]
+
+    Preconditions:
+    - every label is a str, or an int that fits in 64 bits
+    """
+    is_str = array('B')
+    numbers = array('q')
+    text = bytearray()
+    for label in labels:
+        is_str.append(isinstance(label, str))
+        if isinstance(label, str):
+            text += label.encode()
+            numbers.append(len(text))
+        else:
+            numbers.append(label)
+    return pack_sections([array('q', [len(labels), len(text)]), is_str, numbers, text])
+
+
+def _decode_labels(data: memoryview) -> list:
+    """Return the labels encoded in <data> by _encode_labels."""
+    (counts,), start = unpack_sections(data, 0, [('q', 2)])
+    (is_str, numbers, text), _ = unpack_sections(
+        data, start, [('B', counts[0]), ('q', counts[0]), ('B', counts[1])])
+    labels = []
+    text_start = 0
+    for i in range(counts[0]):
+        if is_str[i]:
+            labels.append(str(text[text_start:numbers[i]], 'utf8'))
+            text_start = numbers[i]
+        else:
+            labels.append(numbers[i])
+    return labels
+
+
+################################################################################
+# Helper functions
+################################################################################
+def _top_k(trees: list[SimplePrefixTree], limit: int | None) -> list[tuple[Any, float]]:
+    """Return up to <limit> (value, weight) tuples for the leaves in <trees>
+    with the largest weights, sorted by non-increasing weight.
+
+    If limit is None, return every leaf in <trees>.
+
+    Subtrees are visited best-first using a heap keyed on their weights. Since a
+    subtree's weight is at least the weight of any leaf inside it, a leaf is only
+    popped once no remaining subtree in the heap can contain a heavier leaf, so
+    the search can stop as soon as <limit> leaves have been popped.
+
+    Because each subtrees list is sorted by non-increasing weight, a subtree's
+    next sibling only needs to be pushed once the subtree itself is popped, so
+    the heap holds O(limit * height) entries rather than every child visited.
+
+    Preconditions:
+    - limit is None or limit > 0
+    """
+    matches = []
+    # Heap entries are (-weight, tiebreaker, siblings, i) for the tree siblings[i];
+    # the tiebreaker stops heapq from ever comparing two lists of trees.
+    heap = [(-tree.weight, i, [tree], 0) for i, tree in enumerate(trees) if not tree.is_empty()]
+    heapq.heapify(heap)
+    tiebreaker = len(heap)
+    while heap and (limit is None or len(matches) < limit):
+        _, _, siblings, i = heapq.heappop(heap)
+        tree = siblings[i]
+        if i + 1 < len(siblings):
+            heapq.heappush(heap, (-siblings[i + 1].weight, tiebreaker, siblings, i + 1))
+            tiebreaker += 1
+        if not tree.subtrees:
+            matches.append((tree.root, tree.weight))
+        else:
+            heapq.heappush(heap, (-tree.subtrees[0].weight, tiebreaker, tree.subtrees, 0))
+            tiebreaker += 1
+    return matches
+
+
+def _update_top(top: list[tuple[Any, float]], value: Any, weight: float, size: int) -> None:
+    """Update <top>, the cached top <size> matches of a tree, for the fact that
+    the weight of <value> in the tree has increased to <weight>.
+
+    >>> top = [('a', 5.0), ('b', 3.0)]
+    >>> _update_top(top, 'c', 4.0, 2)
+    >>> top
+    [('a', 5.0), ('c', 4.0)]
+    >>> _update_top(top, 'c', 6.0, 2)
+    >>> top
+    [('c', 6.0), ('a', 5.0)]
+    """
+    for i, (other, _) in enumerate(top):
+        if other == value:
+            del top[i]
+            break
+    else:
+        if len(top) == size:
+            if weight <= top[-1][1]:
+                return
+            top.pop()
+    bisect.insort(top, (value, weight), key=_negated_match_weight)
+
+
+def _negated_match_weight(match: tuple[Any, float]) -> float:
+    """Return the negated weight of the (value, weight) tuple <match>."""
+    return -match[1]
+
+
+def _next_distance_row(row: list[int], prefix: list, element: Any) -> list[int]:
+    """Return the next row of the Levenshtein distance table for <prefix>,
+    after <row>, when the other sequence is extended with <element>.
+
+    row[j] is the edit distance between the other sequence and prefix[:j].
+
+    >>> _next_distance_row([0, 1, 2, 3], ['c', 'a', 't'], 'c')
+    [1, 0, 1, 2]
+    """
+    new_row = [row[0] + 1]
+    for j, prefix_element in enumerate(prefix):
+        new_row.append(min(new_row[j] + 1, row[j + 1] + 1,
+                           row[j] + (prefix_element != element)))
+    return new_row
+
+
+def _move_down(subtrees: list[SimplePrefixTree], i: int) -> None:
+    """Move subtrees[i] towards the back of <subtrees> so that the list is sorted
+    in non-increasing order of weight again.
+
+    Preconditions:
+    - 0 <= i < len(subtrees)
+    - subtrees was sorted before the weight of subtrees[i] decreased
+    """
+    # The subtrees after subtrees[i] are still sorted, so binary search them
+    # for the first one that is no heavier than subtrees[i].
+    j = bisect.bisect_left(subtrees, -subtrees[i].weight, lo=i + 1, key=_negated_weight)
+    if j > i + 1:
+        subtrees.insert(j - 1, subtrees.pop(i))
+
+
+def _index_of(subtrees: list[SimplePrefixTree], subtree: SimplePrefixTree) -> int:
+    """Return the index of <subtree> in <subtrees>, found by binary searching
+    for its weight rather than by comparing it with every subtree in turn
+    (unless <subtrees> is short enough to scan faster).
+
+    Preconditions:
+    - subtree in subtrees
+    - subtrees is sorted in non-increasing order of weight
+    """
+    if len(subtrees) <= _MAX_SCANNED:
+        return subtrees.index(subtree)
+    i = bisect.bisect_left(subtrees, -subtree.weight, key=_negated_weight)
+    while subtrees[i] is not subtree:
+        i += 1
+    return i
+
+
+def _move_up(subtrees: list[SimplePrefixTree], subtree: SimplePrefixTree,
+             weight: float) -> None:
+    """Add <weight> to the weight of <subtree>, and move it towards the front of
+    <subtrees> so that the list stays sorted in non-increasing order of weight.
+
+    Preconditions:
+    - subtree in subtrees
+    - subtrees is sorted in non-increasing order of weight
+    - weight > 0
+    """
+    # Find <subtree> while the list is still sorted
+    i = _index_of(subtrees, subtree)
+    subtree.weight += weight
+    # The subtrees before <subtree> are still sorted, so binary search them
+    # for the first one that is lighter than <subtree>.
+    j = bisect.bisect_right(subtrees, -subtree.weight, hi=i, key=_negated_weight)
+    if j < i:
+        subtrees.insert(j, subtrees.pop(i))
+
+
+def _aligned(offset: int) -> int:
+    """Return <offset> rounded up to a multiple of _ALIGNMENT.
+
+    >>> _aligned(0), _aligned(1), _aligned(8)
+    (0, 8, 8)
+    """
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def _common_length(prefix1: tuple, prefix2: tuple) -> int:
+    """Return the length of the longest common prefix of <prefix1> and <prefix2>.
+
+    >>> _common_length(('c', 'a', 't'), ('c', 'a', 'r', 't'))
+    2
+    """
+    length = 0
+    for element1, element2 in zip(prefix1, prefix2):
+        if element1 != element2:
+            break
+        length += 1
+    return length
+
+
+def _negated_weight(tree: SimplePrefixTree) -> float:
+    """Return the negated weight of <tree>, for binary searching a subtrees list
+    sorted in non-increasing order of weight.
+    """
+    return -tree.weight
 
 
 if __name__ == '__main__':
@@ -270,6 +2058,12 @@ if __name__ == '__main__':
     # "Ctrl + /" or "⌘ + /".
     # import python_ta
     # python_ta.check_all(config={
+    #     'allowed-io': [
+    #         'FrozenPrefixTree.load',
+    #         'FrozenPrefixTree.save'
+    #     ],
+    #     'extra-imports': ['array', 'bisect', 'collections', 'collections.abc', 'heapq', 'mmap',
+    #                       'os', 'pickle', 'struct', 'sys'],
     #     'max-line-length': 100,
     #     'max-nested-blocks': 4
     # })
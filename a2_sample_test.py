@@ -13,8 +13,30 @@ Add your own to practice writing tests and to be confident your code is correct.
 Note: this file is for support purposes only, and is not part of your
 assignment submission.
 """
-from a2_prefix_tree import SimplePrefixTree, CompressedPrefixTree
-from a2_autocomplete_engines import SentenceAutocompleteEngine
+import gzip
+import io
+import os
+import pickle
+import subprocess
+import sys
+import time
+import types
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+import a2_autocomplete_engines
+from a2_prefix_tree import (
+    Autocompleter, SimplePrefixTree, CompressedPrefixTree, FrozenPrefixTree
+)
+from a2_autocomplete_engines import (
+    LetterAutocompleteEngine, SentenceAutocompleteEngine, MelodyAutocompleteEngine,
+    MelodyCodec, _interval_fragments, _sanitize, _sanitize_lines
+)
+from a2_melody import (
+    Melody, CompactMelody, MelodyPlayer, DummyBackend, create_midi_file, create_midi_files
+)
 
 
 ###########################################################################
@@ -49,129 +71,956 @@ def test_simple_prefix_tree_structure() -> None:
     assert right.root == ['d']
     assert right.weight == 4.0
 
-#
-# def test_simple_prefix_tree_autocomplete() -> None:
-#     """This is a test for the correct autocomplete behaviour for a small
-#     simple prefix tree.
-#
-#     NOTE: This test should pass even if you insert these values in a different
-#     order. This is a good thing to try out.
-#     """
-#     t = SimplePrefixTree()
-#     t.insert('cat', 2.0, ['c', 'a', 't'])
-#     t.insert('car', 3.0, ['c', 'a', 'r'])
-#     t.insert('dog', 4.0, ['d', 'o', 'g'])
-#
-#     # Note that the returned tuples *must* be sorted in non-increasing weight
-#     # order. You can (and should) sort the tuples yourself inside
-#     # SimplePrefixTree.autocomplete.
-#     assert t.autocomplete([]) == [('dog', 4.0), ('car', 3.0), ('cat', 2.0)]
-#
-#     # But keep in mind that the greedy algorithm here does not necessarily
-#     # return the highest-weight values!! In this case, the ['c'] subtree
-#     # is recursed on first.
-#     assert t.autocomplete([], 1) == [('car', 3.0)]
-#
-#
-# def test_simple_prefix_tree_remove() -> None:
-#     """This is a test for the correct remove behaviour for a small
-#     simple prefix tree.
-#
-#     NOTE: This test should pass even if you insert these values in a different
-#     order. This is a good thing to try out.
-#     """
-#     t = SimplePrefixTree()
-#     t.insert('cat', 2.0, ['c', 'a', 't'])
-#     t.insert('car', 3.0, ['c', 'a', 'r'])
-#     t.insert('dog', 4.0, ['d', 'o', 'g'])
-#
-#     # The trickiest part is that only *values* should be stored at leaves,
-#     # so even if you remove a specific prefix, its parent might get removed
-#     # from the tree as well!
-#     t.remove(['c', 'a'])
-#
-#     assert len(t) == 1
-#     assert t.weight == 4.0
-#
-#     # There is no more ['c'] subtree!
-#     assert len(t.subtrees) == 1
-#     assert t.subtrees[0].root == ['d']
-#
-#
-# ###########################################################################
-# # Part 4 sample test (add your own for Parts 4 and 5!)
-# ###########################################################################
-# def test_sentence_autocompleter() -> None:
-#     """Basic test for SentenceAutocompleteEngine.
-#
-#     This test relies on the sample_sentences.csv dataset. That file consists
-#     of just a few lines, but there are three important details to notice:
-#
-#         1. You should use the second entry of each csv file as the weight of
-#            the sentence. This entry can be a float! (Don't assume it's an int.)
-#         2. The file contains two sentences that are sanitized to the same
-#            string, and so this value is inserted twice. This means its weight
-#            is the *sum* of the weights from each of the two lines in the file.
-#         3. Numbers *are allowed* in the strings (this is true for both types
-#            of text-based autocomplete engines). Don't remove them!
-#     """
-#     engine = SentenceAutocompleteEngine({
-#         'file': 'data/texts/sample_sentences.csv',
-#         'autocompleter': 'simple'
-#     })
-#
-#     # Check simple autocompletion and sanitization
-#     results = engine.autocomplete('what a')
-#     assert len(results) == 1
-#     assert results[0][0] == 'what a wonderful world'
-#     assert results[0][1] == 1.0
-#
-#     # Check that numbers are allowed in the sentences
-#     results = engine.autocomplete('numbers')
-#     assert len(results) == 1
-#     assert results[0][0] == 'numbers are 0k4y'
-#
-#     # Check that one sentence can be inserted twice
-#     results = engine.autocomplete('a')
-#     assert len(results) == 1
-#     assert results[0][0] == 'a star is born'
-#     assert results[0][1] == 15.0 + 6.5
-#
-#
-# ###########################################################################
-# # Part 6 sample tests
-# ###########################################################################
-# def test_compressed_prefix_tree_structure() -> None:
-#     """This is a test for the correct structure of a compressed prefix tree.
-#
-#     NOTE: This test should pass even if you insert these values in a different
-#     order. This is a good thing to try out.
-#     """
-#     t = CompressedPrefixTree()
-#     t.insert('cat', 2.0, ['c', 'a', 't'])
-#     t.insert('car', 3.0, ['c', 'a', 'r'])
-#     t.insert('dog', 4.0, ['d', 'o', 'g'])
-#
-#     # t has 3 values (note that __len__ only counts the values, which are
-#     # stored at the *leaves* of the tree).
-#     assert len(t) == 3
-#
-#     # t has a total weight of 9.0
-#     assert t.weight == 2.0 + 3.0 + 4.0
-#
-#     # t has two subtrees, and order matters (because of weights).
-#     assert len(t.subtrees) == 2
-#     left = t.subtrees[0]
-#     right = t.subtrees[1]
-#
-#     # But note that the prefix values are different than for a SimplePrefixTree!
-#     assert left.root == ['c', 'a']
-#     assert left.weight == 5.0
-#
-#     assert right.root == ['d', 'o', 'g']
-#     assert right.weight == 4.0
-#
+
+def test_simple_prefix_tree_autocomplete() -> None:
+    """This is a test for the correct autocomplete behaviour for a small
+    simple prefix tree.
+
+    NOTE: This test should pass even if you insert these values in a different
+    order. This is a good thing to try out.
+    """
+    t = SimplePrefixTree()
+    t.insert('cat', 2.0, ['c', 'a', 't'])
+    t.insert('car', 3.0, ['c', 'a', 'r'])
+    t.insert('dog', 4.0, ['d', 'o', 'g'])
+
+    # Note that the returned tuples *must* be sorted in non-increasing weight
+    # order. You can (and should) sort the tuples yourself inside
+    # SimplePrefixTree.autocomplete.
+    assert t.autocomplete([]) == [('dog', 4.0), ('car', 3.0), ('cat', 2.0)]
+
+    # autocomplete searches best-first by weight, so it returns the
+    # highest-weight values even though the ['c'] subtree is heavier.
+    assert t.autocomplete([], 1) == [('dog', 4.0)]
+    assert t.autocomplete(['c'], 1) == [('car', 3.0)]
+    assert t.autocomplete(['c', 'a', 't']) == [('cat', 2.0)]
+    assert t.autocomplete(['c', 'o']) == []
+    assert t.autocomplete(['d', 'o', 'g', 's']) == []
+
+
+def test_simple_prefix_tree_remove() -> None:
+    """This is a test for the correct remove behaviour for a small
+    simple prefix tree.
+
+    NOTE: This test should pass even if you insert these values in a different
+    order. This is a good thing to try out.
+    """
+    t = SimplePrefixTree()
+    t.insert('cat', 2.0, ['c', 'a', 't'])
+    t.insert('car', 3.0, ['c', 'a', 'r'])
+    t.insert('dog', 4.0, ['d', 'o', 'g'])
+
+    # The trickiest part is that only *values* should be stored at leaves,
+    # so even if you remove a specific prefix, its parent might get removed
+    # from the tree as well!
+    t.remove(['c', 'a'])
+
+    assert len(t) == 1
+    assert t.weight == 4.0
+
+    # There is no more ['c'] subtree!
+    assert len(t.subtrees) == 1
+    assert t.subtrees[0].root == ['d']
+
+
+def test_simple_prefix_tree_insert_existing_value() -> None:
+    """Test that re-inserting a value adds to its weight instead of creating
+    a second leaf, and that each subtree's root is its full prefix.
+    """
+    t = SimplePrefixTree()
+    t.insert('cat', 2.0, ['c', 'a', 't'])
+    t.insert('cab', 1.0, ['c', 'a', 'b'])
+    t.insert('cat', 3.0, ['c', 'a', 't'])
+
+    assert len(t) == 2
+    assert t.weight == 6.0
+
+    ca = t.subtrees[0].subtrees[0]
+    assert ca.root == ['c', 'a']
+    assert ca.weight == 6.0
+    assert len(ca) == 2
+
+    cat = ca.subtrees[0]
+    assert cat.root == ['c', 'a', 't']
+    assert len(cat.subtrees) == 1
+    assert cat.subtrees[0].root == 'cat'
+    assert cat.subtrees[0].weight == 5.0
+
+
+def test_simple_prefix_tree_insert_deep_prefix() -> None:
+    """Test that inserting a value whose prefix is longer than Python's default
+    recursion limit works.
+    """
+    t = SimplePrefixTree()
+    t.insert('a' * 1050, 1.0, ['a'] * 1050)
+    t.insert('a' * 1050, 1.0, ['a'] * 1050)
+
+    subtree = t
+    for _ in range(1050):
+        assert len(subtree.subtrees) == 1
+        subtree = subtree.subtrees[0]
+        assert subtree.weight == 2.0
+    assert subtree.root == ['a'] * 1050
+    assert subtree.subtrees[0].root == 'a' * 1050
+
+
+def test_simple_prefix_tree_subtrees_stay_sorted() -> None:
+    """Test that increasing a value's weight moves it (and its ancestors) ahead
+    of lighter siblings, so that every subtrees list stays sorted.
+    """
+    t = SimplePrefixTree()
+    t.insert('cat', 2.0, ['c', 'a', 't'])
+    t.insert('car', 3.0, ['c', 'a', 'r'])
+    t.insert('dog', 6.0, ['d', 'o', 'g'])
+    assert [s.root for s in t.subtrees] == [['d'], ['c']]
+
+    t.insert('cat', 4.0, ['c', 'a', 't'])
+    assert [s.root for s in t.subtrees] == [['c'], ['d']]
+    ca = t.subtrees[0].subtrees[0]
+    assert [s.root for s in ca.subtrees] == [['c', 'a', 't'], ['c', 'a', 'r']]
+    _assert_sorted(t)
+
+    assert t.autocomplete([], 2) == [('dog', 6.0), ('cat', 6.0)] or \
+        t.autocomplete([], 2) == [('cat', 6.0), ('dog', 6.0)]
+    assert t.autocomplete(['c'], 2) == [('cat', 6.0), ('car', 3.0)]
+
+    # Long subtrees lists are searched by weight rather than scanned
+    t = SimplePrefixTree()
+    for i in range(200):
+        t.insert(i, 1.0 + i % 7, [i % 100])
+    for i in range(0, 200, 3):
+        t.insert(i, 2.0, [i % 100])
+    _assert_sorted(t)
+    assert t.autocomplete([], 1)[0][1] == 9.0
+
+
+def test_leaf_counts_are_maintained() -> None:
+    """Test that the leaf count cached in every subtree (and returned by
+    __len__) stays equal to the number of leaves below it, as values are
+    inserted again, inserted with unhashable values, and removed.
+    """
+    for t in [SimplePrefixTree(), CompressedPrefixTree()]:
+        assert len(t) == 0
+        for word in ['cat', 'car', 'care', 'dog', 'do', 'cat', 'care', '']:
+            t.insert(word, 1.0, list(word))
+            _assert_leaf_counts(t)
+        assert len(t) == 6
+
+        t.insert(['unhashable'], 1.0, ['c', 'a'])
+        t.insert(['unhashable'], 1.0, ['c', 'a'])
+        _assert_leaf_counts(t)
+        assert len(t) == 7
+
+        t.remove(['c', 'a', 'r'])
+        _assert_leaf_counts(t)
+        assert len(t) == 5
+        t.remove(['d'])
+        _assert_leaf_counts(t)
+        assert len(t) == 3
+        t.remove([])
+        assert len(t) == 0
+
+
+def _assert_leaf_counts(t: SimplePrefixTree) -> None:
+    """Assert that len(subtree) is the number of leaves in subtree, for every
+    subtree of <t>.
+    """
+    if t.is_leaf():
+        assert len(t) == 1
+    else:
+        for subtree in t.subtrees:
+            _assert_leaf_counts(subtree)
+        assert len(t) == sum(len(subtree) for subtree in t.subtrees)
+
+
+def test_simple_prefix_tree_many_subtrees() -> None:
+    """Test lookups in a tree with enough subtrees to be indexed by a dict,
+    and that leaves still report an empty subtrees list.
+    """
+    t = SimplePrefixTree()
+    letters = 'abcdefghij'
+    for i, letter in enumerate(letters):
+        t.insert(letter + 'x', float(i + 1), [letter, 'x'])
+    t.insert('e', 100.0, ['e'])
+
+    assert len(t.subtrees) == len(letters)
+    for i, letter in enumerate(letters):
+        assert t.autocomplete([letter, 'x']) == [(letter + 'x', float(i + 1))]
+    assert t.autocomplete(['e'], 1) == [('e', 100.0)]
+
+    leaf = t.subtrees[0].subtrees[0]
+    assert leaf.root == 'e'
+    assert leaf.subtrees == []
+    assert leaf.is_leaf()
+
+
+def _assert_sorted(t: SimplePrefixTree) -> None:
+    """Assert that every subtrees list in <t> is sorted by non-increasing weight."""
+    weights = [subtree.weight for subtree in t.subtrees]
+    assert weights == sorted(weights, reverse=True)
+    for subtree in t.subtrees:
+        _assert_sorted(subtree)
+
+
+def test_fuzzy_autocomplete() -> None:
+    """Test that fuzzy_autocomplete matches values whose prefixes are within
+    the given edit distance of the prefix, sorted by weight, and that a frozen
+    copy of the tree gives the same results.
+    """
+    words = {'gandalf': 11.0, 'gandalf laughed': 5.0, 'frodo': 28.0, 'gimli': 3.0,
+             'go': 1.0}
+    for t in [SimplePrefixTree(), CompressedPrefixTree()]:
+        for word, weight in words.items():
+            t.insert(word, weight, list(word))
+
+        assert t.autocomplete(list('gandlf')) == []
+        assert t.fuzzy_autocomplete(list('gandlf'), 1) == [('gandalf', 11.0),
+                                                           ('gandalf laughed', 5.0)]
+        assert t.fuzzy_autocomplete(list('gandlf'), 1, 1) == [('gandalf', 11.0)]
+        # 'frdo' is one insertion from 'frodo'; 'gi' is one substitution from 'go'
+        assert t.fuzzy_autocomplete(list('frdo'), 1) == [('frodo', 28.0)]
+        assert t.fuzzy_autocomplete(list('gi'), 1) == [('gandalf', 11.0),
+                                                       ('gandalf laughed', 5.0),
+                                                       ('gimli', 3.0), ('go', 1.0)]
+        assert t.fuzzy_autocomplete(list('gim'), 0) == t.autocomplete(list('gim'))
+        assert len(t.fuzzy_autocomplete(list('xy'), 2)) == 5
+        assert t.fuzzy_autocomplete(list('xyz'), 2) == []
+
+        frozen = t.freeze()
+        for prefix in ['gandlf', 'frdo', 'gi', 'gim', 'xy', 'xyz', '']:
+            for max_distance in [0, 1, 2]:
+                for limit in [None, 1, 2]:
+                    assert frozen.fuzzy_autocomplete(list(prefix), max_distance, limit) == \
+                        t.fuzzy_autocomplete(list(prefix), max_distance, limit)
+
+    engine = LetterAutocompleteEngine({
+        'file': 'data/texts/sample_words.txt',
+        'autocompleter': 'simple'
+    })
+    assert engine.autocomplete('dor') == []
+    assert engine.autocomplete('dor', None, 1) == [('door', 2.0)]
+
+
+def test_top_k_cache() -> None:
+    """Test that autocomplete with a cache_size gives the same matches as
+    without one after inserts and removes change the cached order.
+    """
+    for t in [SimplePrefixTree(2), CompressedPrefixTree(2)]:
+        t.insert('cat', 2.0, ['c', 'a', 't'])
+        t.insert('car', 3.0, ['c', 'a', 'r'])
+        t.insert('cab', 1.0, ['c', 'a', 'b'])
+        assert t.autocomplete(['c'], 2) == [('car', 3.0), ('cat', 2.0)]
+
+        t.insert('cab', 4.0, ['c', 'a', 'b'])
+        assert t.autocomplete(['c'], 2) == [('cab', 5.0), ('car', 3.0)]
+        assert t.autocomplete(['c'], 1) == [('cab', 5.0)]
+        # A limit larger than the cache is answered by a search
+        assert t.autocomplete(['c']) == [('cab', 5.0), ('car', 3.0), ('cat', 2.0)]
+
+        t.remove(['c', 'a', 'b'])
+        assert t.autocomplete(['c'], 2) == [('car', 3.0), ('cat', 2.0)]
+
+    engine = LetterAutocompleteEngine({
+        'file': 'data/texts/sample_words.txt',
+        'autocompleter': 'compressed',
+        'cache_size': 3
+    })
+    assert engine.autocomplete('d', 2) == LetterAutocompleteEngine({
+        'file': 'data/texts/sample_words.txt',
+        'autocompleter': 'compressed'
+    }).autocomplete('d', 2)
+
+
+def test_query_cache(monkeypatch) -> None:
+    """Test that an engine's query cache reuses results until the autocompleter
+    changes or the results expire, and counts its hits and misses.
+    """
+    engine = LetterAutocompleteEngine({
+        'file': 'data/texts/sample_words.txt',
+        'autocompleter': 'simple',
+        'query_cache_size': 2
+    })
+    assert engine.autocomplete('d', 2) == [('door', 2.0), ('danger', 1.0)]
+    assert engine.autocomplete('d', 2) == [('door', 2.0), ('danger', 1.0)]
+    assert engine.cache_info() == (1, 1, 2, 1)
+
+    engine.remove('do')
+    assert engine.autocomplete('d', 2) == [('danger', 1.0)]
+    engine.autocompleter.insert('dz', 9.0, ['d', 'z'])
+    assert engine.autocomplete('d', 2) == [('dz', 9.0), ('danger', 1.0)]
+    assert engine.cache_info().misses == 3
+
+    # The least recently used result is discarded when the cache is full
+    engine.autocomplete('c')
+    engine.autocomplete('d', 2)
+    engine.autocomplete('a')
+    assert engine.cache_info().currsize == 2
+    assert engine.cache_info().hits == 2
+    engine.autocomplete('c')
+    assert engine.cache_info().misses == 6
+    engine.cache_clear()
+    assert engine.cache_info() == (0, 0, 2, 0)
+
+    engine = SentenceAutocompleteEngine({
+        'file': ['how to tie a tie,3\n', 'how to cook rice,2\n', 'what is love,1\n'],
+        'autocompleter': 'compressed',
+        'query_cache_size': 10,
+        'query_cache_ttl': 60.0
+    })
+    # Replace the clock the cache reads, so that the test does not depend on
+    # how long each call takes
+    now = [1000.0]
+    monkeypatch.setattr(a2_autocomplete_engines, 'time',
+                        types.SimpleNamespace(monotonic=lambda: now[0]))
+    engine.autocomplete('how to', 3)
+    now[0] += 59.0
+    engine.autocomplete('how to', 3)
+    now[0] += 2.0
+    engine.autocomplete('how to', 3)
+    assert engine.cache_info()[:2] == (1, 2)
+
+
+def test_autocomplete_sessions() -> None:
+    """Test that a session extended and shortened one element at a time
+    autocompletes its prefix like autocomplete, even after the tree changes.
+    """
+    for t in [SimplePrefixTree(), CompressedPrefixTree(1)]:
+        for word in ['cat', 'car', 'care', 'dog']:
+            t.insert(word, float(len(word)), list(word))
+        for tree in [t, t.freeze()]:
+            cursor = tree.cursor()
+            cursor.push('c')
+            cursor.push('a')
+            assert cursor.autocomplete() == tree.autocomplete(['c', 'a'])
+            cursor.push('r')
+            assert cursor.autocomplete(1) == [('care', 4.0)]
+            cursor.push('x')
+            assert cursor.autocomplete() == []
+            assert cursor.pop() == 'x'
+            assert cursor.pop() == 'r'
+            assert cursor.prefix == ['c', 'a']
+            assert cursor.autocomplete(1) == [('care', 4.0)]
+
+        cursor = t.cursor()
+        cursor.push('c')
+        t.remove(['c', 'a', 'r'])
+        t.insert('cow', 3.0, ['c', 'o', 'w'])
+        assert cursor.autocomplete() == [('cow', 3.0), ('cat', 3.0)] or \
+            cursor.autocomplete() == [('cat', 3.0), ('cow', 3.0)]
+
+    engine = SentenceAutocompleteEngine({
+        'file': ['how to tie a tie,3\n', 'how to cook rice,2\n', 'what is love,1\n'],
+        'autocompleter': 'compressed'
+    })
+    session = engine.begin()
+    session.push('how')
+    session.push('to')
+    assert session.autocomplete(5) == [('how to tie a tie', 3.0), ('how to cook rice', 2.0)]
+
+
+class _ListAutocompleter(Autocompleter):
+    """A minimal Autocompleter that overrides only autocomplete."""
+    entries: list[tuple[Any, float, list]]
+
+    def __init__(self, entries: list[tuple[Any, float, list]]) -> None:
+        self.entries = entries
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix."""
+        matches = [(value, weight) for value, weight, value_prefix in self.entries
+                   if value_prefix[:len(prefix)] == prefix]
+        matches.sort(key=lambda match: -match[1])
+        return matches[:limit]
+
+
+def test_cursor_of_minimal_autocompleter() -> None:
+    """Test that the generic cursor works for an Autocompleter subclass that
+    does not override generation or the cursor methods.
+    """
+    autocompleter = _ListAutocompleter([('cat', 3.0, list('cat')),
+                                        ('car', 1.0, list('car')),
+                                        ('dog', 2.0, list('dog'))])
+    assert autocompleter.generation() == 0
+    cursor = autocompleter.cursor()
+    assert cursor.autocomplete() == [('cat', 3.0), ('dog', 2.0), ('car', 1.0)]
+    cursor.push('c')
+    cursor.push('a')
+    assert cursor.autocomplete(1) == [('cat', 3.0)]
+    cursor.push('r')
+    assert cursor.autocomplete() == [('car', 1.0)]
+    assert cursor.pop() == 'r'
+    assert cursor.autocomplete() == [('cat', 3.0), ('car', 1.0)]
+
+
+def test_remove_reorders_ancestors() -> None:
+    """Test that removing values moves each ancestor of the removed subtree
+    back into place among its siblings, and prunes ancestors left empty.
+    """
+    for t in [SimplePrefixTree(), CompressedPrefixTree()]:
+        t.insert('cat', 5.0, ['c', 'a', 't'])
+        t.insert('cod', 2.0, ['c', 'o', 'd'])
+        t.insert('dog', 4.0, ['d', 'o', 'g'])
+        t.insert('bee', 3.0, ['b', 'e', 'e'])
+
+        t.remove(['c', 'a'])
+        assert t.weight == 9.0
+        assert len(t) == 3
+        assert [subtree.weight for subtree in t.subtrees] == [4.0, 3.0, 2.0]
+        assert t.autocomplete(['c']) == [('cod', 2.0)]
+
+        t.remove(['c', 'o', 'd'])
+        assert [subtree.weight for subtree in t.subtrees] == [4.0, 3.0]
+        assert t.autocomplete(['c']) == []
+
+
+def test_decay_and_compact() -> None:
+    """Test that decay scales every weight, so that values inserted later can
+    outrank values inserted earlier, and that compact removes light values.
+    """
+    for t in [SimplePrefixTree(2), CompressedPrefixTree()]:
+        t.insert('cat', 8.0, ['c', 'a', 't'])
+        t.insert('car', 2.0, ['c', 'a', 'r'])
+        t.insert('dog', 4.0, ['d', 'o', 'g'])
+        assert t.autocomplete(['c'], 2) == [('cat', 8.0), ('car', 2.0)]
+
+        t.decay(0.25)
+        assert t.autocomplete([]) == [('cat', 2.0), ('dog', 1.0), ('car', 0.5)]
+        t.insert('car', 3.0, ['c', 'a', 'r'])
+        assert t.autocomplete(['c'], 2) == [('car', 3.5), ('cat', 2.0)]
+
+        t.compact(1.5)
+        assert len(t) == 2
+        assert t.autocomplete([]) == [('car', 3.5), ('cat', 2.0)]
+        assert t.freeze().autocomplete(['c']) == [('car', 3.5), ('cat', 2.0)]
+
+        # Decaying by a tiny factor rescales the stored weights
+        t.decay(1e-150)
+        t.insert('dog', 1.0, ['d', 'o', 'g'])
+        assert t.autocomplete([], 1) == [('dog', 1.0)]
+        t.compact(1e-100)
+        assert t.autocomplete([]) == [('dog', 1.0)]
+
+
+###########################################################################
+# Part 4 sample test (add your own for Parts 4 and 5!)
+###########################################################################
+def test_sentence_autocompleter() -> None:
+    """Basic test for SentenceAutocompleteEngine.
+
+    This test relies on the sample_sentences.csv dataset. That file consists
+    of just a few lines, but there are three important details to notice:
+
+        1. You should use the second entry of each csv file as the weight of
+           the sentence. This entry can be a float! (Don't assume it's an int.)
+        2. The file contains two sentences that are sanitized to the same
+           string, and so this value is inserted twice. This means its weight
+           is the *sum* of the weights from each of the two lines in the file.
+        3. Numbers *are allowed* in the strings (this is true for both types
+           of text-based autocomplete engines). Don't remove them!
+    """
+    engine = SentenceAutocompleteEngine({
+        'file': 'data/texts/sample_sentences.csv',
+        'autocompleter': 'simple'
+    })
+
+    # Check simple autocompletion and sanitization
+    results = engine.autocomplete('what a')
+    assert len(results) == 1
+    assert results[0][0] == 'what a wonderful world'
+    assert results[0][1] == 1.0
+
+    # Check that numbers are allowed in the sentences
+    results = engine.autocomplete('numbers')
+    assert len(results) == 1
+    assert results[0][0] == 'numbers are 0k4y'
+
+    # Check that one sentence can be inserted twice
+    results = engine.autocomplete('a')
+    assert len(results) == 1
+    assert results[0][0] == 'a star is born'
+    assert results[0][1] == 15.0 + 6.5
+
+
+def test_melody_autocompleter() -> None:
+    """Basic test for MelodyAutocompleteEngine, which uses interval sequences
+    as prefixes and stops reading each line at its first blank entry.
+    """
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/melodies/songbook.csv',
+        'autocompleter': 'simple'
+    })
+    results = engine.autocomplete([1, 2])
+    assert 'Danny Boy' in {melody.name for melody, _ in results}
+    assert all(weight == 1.0 for _, weight in results)
+
+    danny_boy = engine.autocomplete([1, 2, 2, -2, 2, 5, -2, -3, -2, -2, -3])
+    assert len(danny_boy) == 1
+    assert danny_boy[0][0].name == 'Danny Boy'
+    assert danny_boy[0][0].notes[-1] == (62, 1200)
+
+
+def test_engines_read_any_source(tmp_path) -> None:
+    """Test that the engines read gzip-compressed files, open files and lists
+    of lines the same way as plain files.
+    """
+    with open('data/texts/sample_sentences.csv', 'rb') as f:
+        data = f.read()
+    compressed = tmp_path / 'sample_sentences.csv.gz'
+    compressed.write_bytes(gzip.compress(data))
+
+    expected = SentenceAutocompleteEngine({
+        'file': 'data/texts/sample_sentences.csv', 'autocompleter': 'simple'
+    }).autocomplete('')
+    for source in [str(compressed), compressed, io.BytesIO(data),
+                   io.BytesIO(gzip.compress(data)),
+                   io.StringIO(data.decode('utf8'), newline=''),
+                   data.decode('utf8').splitlines(keepends=True)]:
+        engine = SentenceAutocompleteEngine({'file': source, 'autocompleter': 'simple'})
+        assert engine.autocomplete('') == expected
+
+    engine = LetterAutocompleteEngine({
+        'file': ['Cat!\n', '   \n', 'car\r\n', 'cat'], 'autocompleter': 'compressed'
+    })
+    assert engine.autocomplete('ca') == [('cat', 2.0), ('car', 1.0)]
+
+
+def test_engines_leave_open_files_open(tmp_path) -> None:
+    """Test that reading an open binary file leaves it open, since it belongs
+    to the caller.
+    """
+    path = tmp_path / 'words.txt.gz'
+    path.write_bytes(gzip.compress(b'cat\ncar\n'))
+    with open(path, 'rb') as f, open(path, 'rb', buffering=0) as raw:
+        for source in [f, raw, io.BytesIO(b'cat\ncar\n')]:
+            engine = LetterAutocompleteEngine({'file': source, 'autocompleter': 'simple'})
+            assert len(engine.autocompleter) == 2
+            assert not source.closed
+            source.seek(0)
+            assert source.read(2) in [b'\x1f\x8b', b'ca']
+
+
+def test_engines_read_with_workers() -> None:
+    """Test that reading an engine's file with several worker processes gives
+    the same results as reading it in one process.
+    """
+    for engine_class, file, prefix in [
+        (SentenceAutocompleteEngine, 'data/texts/sample_sentences.csv', ''),
+        (LetterAutocompleteEngine, 'data/texts/sample_words.txt', 'ca'),
+    ]:
+        expected = engine_class({'file': file, 'autocompleter': 'compressed'})
+        for workers in [2, 7]:
+            engine = engine_class({'file': file, 'autocompleter': 'compressed',
+                                   'workers': workers})
+            assert engine.autocomplete(prefix) == expected.autocomplete(prefix)
+            assert len(engine.autocompleter) == len(expected.autocompleter)
+
+
+def test_sanitize_matches_handout() -> None:
+    """Test that _sanitize and _sanitize_lines agree with the handout's
+    definition of sanitizing, on ASCII and non-ASCII lines.
+    """
+    lines = ['a!!! StAr? IS B&*o()rN\n', '', 'snake_case\tTABS\r\n', '\0nul\0',
+             'Ça va, ÉMILE? ½ ²', 'ΟΔΥΣΣΕΥΣ!']
+    expected = [''.join(char for char in line.lower() if char.isalnum() or char == ' ')
+                for line in lines]
+    assert [_sanitize(line) for line in lines] == expected
+    assert _sanitize_lines(lines) == expected
+    assert _sanitize_lines(lines[:3]) == expected[:3]
+    assert _sanitize_lines([]) == []
+
+
+def test_melody_search_finds_fragments() -> None:
+    """Test that MelodyAutocompleteEngine.search finds melodies containing a
+    fragment of intervals anywhere, ranked by their current weights, and not
+    melodies that have been removed.
+    """
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/melodies/songbook.csv',
+        'autocompleter': 'simple'
+    })
+    # The middle of Danny Boy
+    fragment = [2, 5, -2, -3, -2]
+    results = engine.search(fragment)
+    assert 'Danny Boy' in {melody.name for melody, _ in results}
+    for melody, weight in results:
+        intervals = list(melody.intervals)
+        assert any(intervals[i:i + len(fragment)] == fragment for i in range(len(intervals)))
+        assert weight == 1.0
+    assert len(engine.search([])) == 25
+    assert len(engine.search([], 3)) == 3
+    assert engine.search([1000]) == []
+
+    # Results are ranked by the weights currently in the Autocompleter
+    melody = results[-1][0]
+    engine.autocompleter.insert(melody, 2.0, list(melody.intervals))
+    assert engine.search(fragment)[0] == (melody, 3.0)
+    engine.autocompleter.decay(0.5)
+    assert engine.search(fragment)[0] == (melody, 1.5)
+
+    danny_boy = [1, 2, 2, -2, 2, 5, -2, -3, -2, -2, -3]
+    engine.remove(danny_boy)
+    assert 'Danny Boy' not in {melody.name for melody, _ in engine.search(fragment)}
+    assert len(engine.search([])) == 24
+    # The removed melody's runs of intervals are pruned from the index
+    assert all(len(ids) > 0 for ids in engine._fragments.values())
+    assert sum(len(ids) for ids in engine._fragments.values()) == \
+        sum(len(_interval_fragments(list(melody.intervals))) for melody, _ in engine.search([]))
+
+
+def test_melody_remove_skips_melodies_inserted_directly() -> None:
+    """Test that MelodyAutocompleteEngine.remove also removes matching melodies
+    that were inserted into its Autocompleter directly, rather than loaded from
+    its file.
+    """
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/melodies/songbook.csv',
+        'autocompleter': 'simple'
+    })
+    melody = CompactMelody('new tune', [(60, 100), (62, 100), (64, 100), (65, 100)])
+    engine.autocompleter.insert(melody, 1.0, list(melody.intervals))
+    assert (melody, 1.0) in engine.autocomplete([2, 2])
+
+    engine.remove([2, 2])
+    assert engine.autocomplete([2, 2]) == []
+    assert all(found.intervals[:2].tolist() != [2, 2] for found, _ in engine.search([]))
+
+
+def test_compact_melody() -> None:
+    """Test that a CompactMelody behaves like a Melody with the same notes,
+    including when its notes are reassigned, and that MelodyAutocompleteEngine
+    stores CompactMelody objects.
+    """
+    notes = [(60, 400), (62, 400), (60, 800), (72, 100)]
+    melody = CompactMelody('tune', notes)
+    assert isinstance(melody, Melody)
+    assert melody.name == 'tune'
+    assert melody.notes == notes
+    assert list(melody.intervals) == [2, -2, 12]
+    assert repr(melody) == repr(Melody('tune', notes))
+
+    melody.notes = [(60, 200), (67, 200)]
+    assert melody.notes == [(60, 200), (67, 200)]
+    assert list(melody.pitches) == [60, 67]
+    assert list(melody.durations) == [200, 200]
+    assert list(melody.intervals) == [7]
+
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/melodies/songbook.csv',
+        'autocompleter': 'compressed'
+    })
+    for melody, _ in engine.autocomplete([]):
+        assert isinstance(melody, CompactMelody)
+        assert engine.autocomplete(list(melody.intervals))
+
+
+def test_midi_files_are_cached() -> None:
+    """Test that MIDI files for the same notes have the same contents, whether
+    they are created one at a time or in a batch.
+    """
+    notes = [(60, 400), (62, 400), (60, 800)]
+    first = create_midi_file(notes)
+    second = create_midi_file(list(notes))
+    assert first is not second
+    assert first.getvalue() == second.getvalue()
+    assert first.getvalue().startswith(b'MThd')
+
+    files = create_midi_files([Melody('a', notes), CompactMelody('b', notes),
+                               Melody('c', [(72, 100)])])
+    assert [f.getvalue() for f in files[:2]] == [first.getvalue()] * 2
+    assert files[2].getvalue() != first.getvalue()
+
+
+def test_melody_player_plays_in_background() -> None:
+    """Test that a MelodyPlayer plays queued melodies in order without
+    blocking, and can skip and cancel them.
+    """
+    backend = DummyBackend(time_scale=100.0)
+    player = MelodyPlayer(backend)
+    melodies = [Melody(name, [(60 + i, 1000)]) for i, name in enumerate('abcd')]
+    start = time.monotonic()
+    for melody in melodies[:3]:
+        melody.play(player)
+    assert time.monotonic() - start < 1.0
+
+    assert _wait_for(lambda: player.now_playing is melodies[0])
+    assert player.pending() == melodies[1:3]
+    assert not player.wait(0.05)
+
+    player.skip()
+    assert _wait_for(lambda: player.now_playing is melodies[1])
+    player.cancel()
+    assert player.wait(5.0)
+    assert player.now_playing is None and player.pending() == []
+    assert backend.played == [create_midi_file(melody.notes).getvalue()
+                              for melody in melodies[:2]]
+    assert backend.stopped == 2
+
+    backend.time_scale = 0.0
+    melodies[3].play(player)
+    assert player.wait(5.0)
+    assert len(backend.played) == 3
+    assert player.last_error is None
+    player.close()
+
+    # A melody that the backend fails to start is skipped
+    player = MelodyPlayer(_FailingBackend())
+    melodies[0].play(player)
+    assert player.wait(5.0)
+    assert isinstance(player.last_error, RuntimeError)
+    player.close()
+
+
+class _FailingBackend(DummyBackend):
+    """A playback backend that cannot start any file."""
+
+    def start(self, midi_file: io.BytesIO, duration: float) -> None:
+        """Raise RuntimeError."""
+        raise RuntimeError('no audio device')
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> bool:
+    """Return whether <condition>() becomes true within <timeout> seconds."""
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+###########################################################################
+# Part 6 sample tests
+###########################################################################
+def test_compressed_prefix_tree_structure() -> None:
+    """This is a test for the correct structure of a compressed prefix tree.
+
+    NOTE: This test should pass even if you insert these values in a different
+    order. This is a good thing to try out.
+    """
+    t = CompressedPrefixTree()
+    t.insert('cat', 2.0, ['c', 'a', 't'])
+    t.insert('car', 3.0, ['c', 'a', 'r'])
+    t.insert('dog', 4.0, ['d', 'o', 'g'])
+
+    # t has 3 values (note that __len__ only counts the values, which are
+    # stored at the *leaves* of the tree).
+    assert len(t) == 3
+
+    # t has a total weight of 9.0
+    assert t.weight == 2.0 + 3.0 + 4.0
+
+    # t has two subtrees, and order matters (because of weights).
+    assert len(t.subtrees) == 2
+    left = t.subtrees[0]
+    right = t.subtrees[1]
+
+    # But note that the prefix values are different than for a SimplePrefixTree!
+    assert left.root == ['c', 'a']
+    assert left.weight == 5.0
+
+    assert right.root == ['d', 'o', 'g']
+    assert right.weight == 4.0
+
+
+def test_compressed_prefix_tree_split_and_merge() -> None:
+    """Test that inserting a value that leaves an edge partway along splits
+    that edge, and that removing values merges the edge back together.
+    """
+    t = CompressedPrefixTree()
+    t.insert('cart', 1.0, ['c', 'a', 'r', 't'])
+    t.insert('care', 2.0, ['c', 'a', 'r', 'e'])
+    assert [s.root for s in t.subtrees] == [['c', 'a', 'r']]
+
+    t.insert('cab', 4.0, ['c', 'a', 'b'])
+    ca = t.subtrees[0]
+    assert ca.root == ['c', 'a']
+    assert [s.root for s in ca.subtrees] == [['c', 'a', 'b'], ['c', 'a', 'r']]
+    assert len(ca) == 3
+    assert t.autocomplete(['c', 'a', 'r']) == [('care', 2.0), ('cart', 1.0)]
+    assert t.autocomplete(['c', 'a', 'r', 't', 's']) == []
+
+    # Removing ['c', 'a', 'b'] leaves ['c', 'a'] with a single non-leaf
+    # subtree, so ['c', 'a'] is merged away.
+    t.remove(['c', 'a', 'b'])
+    assert len(t) == 2
+    assert t.weight == 3.0
+    assert [s.root for s in t.subtrees] == [['c', 'a', 'r']]
+
+    # A prefix that ends partway along an edge matches everything below it.
+    t.remove(['c'])
+    assert t.is_empty()
+    assert len(t) == 0
+    assert t.subtrees == []
+
+
+def test_compressed_prefix_tree_matches_simple() -> None:
+    """Test that a CompressedPrefixTree gives the same autocomplete results as
+    a SimplePrefixTree, with fewer subtrees.
+    """
+    words = ['danger', 'door', 'dog', 'do', 'care', 'car', 'cat', 'door', 'd']
+    simple = SimplePrefixTree()
+    compressed = CompressedPrefixTree()
+    for i, word in enumerate(words):
+        simple.insert(word, float(i + 1), list(word))
+        compressed.insert(word, float(i + 1), list(word))
+
+    assert len(compressed) == len(simple) == 8
+    for prefix in ['', 'd', 'do', 'doo', 'ca', 'x']:
+        assert compressed.autocomplete(list(prefix)) == simple.autocomplete(list(prefix))
+    assert _count_subtrees(compressed) < _count_subtrees(simple)
+
+
+def _count_subtrees(t: SimplePrefixTree) -> int:
+    """Return the number of subtrees in <t>, including <t> itself."""
+    return 1 + sum(_count_subtrees(subtree) for subtree in t.subtrees)
+
+
+def test_bulk_load_matches_insert() -> None:
+    """Test that bulk loading a prefix tree gives the same tree as inserting
+    the same values one at a time, and that bulk loading a non-empty tree
+    adds to it.
+    """
+    entries = [('danger', 1.0, list('danger')), ('door', 2.0, list('door')),
+               ('dog', 3.0, list('dog')), ('do', 4.0, list('do')),
+               ('car', 5.0, list('car')), ('door', 6.0, list('door')),
+               ('', 1.0, [])]
+    for tree_class in [SimplePrefixTree, CompressedPrefixTree]:
+        inserted = tree_class()
+        for value, weight, prefix in entries:
+            inserted.insert(value, weight, prefix)
+        loaded = tree_class()
+        loaded.bulk_load(entries)
+
+        assert len(loaded) == len(inserted) == 6
+        assert loaded.weight == inserted.weight == 22.0
+        assert str(loaded) == str(inserted)
+        assert _count_subtrees(loaded) == _count_subtrees(inserted)
+        for prefix in ['', 'd', 'do', 'doo', 'c', 'x']:
+            assert loaded.autocomplete(list(prefix)) == inserted.autocomplete(list(prefix))
+
+        loaded.bulk_load([('cat', 20.0, list('cat')), ('do', 1.0, list('do'))])
+        assert loaded.autocomplete(list('d'), 2) == [('door', 8.0), ('do', 5.0)]
+        assert loaded.autocomplete([], 1) == [('cat', 20.0)]
+
+
+###########################################################################
+# Frozen prefix trees
+###########################################################################
+def test_frozen_prefix_tree_autocomplete() -> None:
+    """Test that a frozen copy of a prefix tree gives the same autocomplete
+    results as the tree, and is not affected by later inserts.
+    """
+    for t in [SimplePrefixTree(), CompressedPrefixTree()]:
+        t.insert('cat', 2.0, ['c', 'a', 't'])
+        t.insert('car', 3.0, ['c', 'a', 'r'])
+        t.insert('dog', 4.0, ['d', 'o', 'g'])
+        t.insert('do', 1.0, ['d', 'o'])
+
+        frozen = t.freeze()
+        assert len(frozen) == 4
+        for prefix in [[], ['c'], ['c', 'a', 'r'], ['d', 'o'], ['d', 'x'], ['c', 'a', 'r', 's']]:
+            for limit in [None, 1, 2]:
+                assert frozen.autocomplete(prefix, limit) == t.autocomplete(prefix, limit)
+
+        t.insert('cab', 10.0, ['c', 'a', 'b'])
+        assert frozen.autocomplete(['c'], 1) == [('car', 3.0)]
+
+        with pytest.raises(NotImplementedError):
+            frozen.insert('cab', 1.0, ['c', 'a', 'b'])
+        with pytest.raises(NotImplementedError):
+            frozen.remove(['c'])
+
+
+def test_frozen_prefix_tree_empty() -> None:
+    """Test freezing an empty prefix tree."""
+    frozen = SimplePrefixTree().freeze()
+    assert len(frozen) == 0
+    assert frozen.autocomplete([]) == []
+    assert frozen.autocomplete(['a']) == []
+
+
+def test_saved_prefix_tree_loads(tmp_path) -> None:
+    """Test that a saved prefix tree loads with the same values, weights and
+    autocomplete results as a frozen copy of the tree.
+    """
+    for t in [SimplePrefixTree(), CompressedPrefixTree()]:
+        t.insert('cat', 2.0, ['c', 'a', 't'])
+        t.insert('car', 3.0, ['c', 'a', 'r'])
+        t.insert(('dog', 1), 4.0, ['d', 'o', 'g'])
+        t.insert('do', 1.5, ['d', 'o'])
+        t.save(tmp_path / 'tree.a2pt')
+        frozen = t.freeze()
+        with FrozenPrefixTree.load(tmp_path / 'tree.a2pt') as loaded:
+            assert len(loaded) == 4
+            for prefix in [[], ['c'], ['c', 'a', 'r'], ['d', 'o'], ['d', 'x'], ['x']]:
+                for limit in [None, 1, 2]:
+                    assert loaded.autocomplete(prefix, limit) == \
+                        frozen.autocomplete(prefix, limit)
+            assert loaded.autocomplete(['d'], 1) == [(('dog', 1), 4.0)]
+        assert len(loaded) == 0
+        assert loaded.autocomplete([]) == []
+        frozen.close()
+        assert len(frozen) == 4
+
+    SimplePrefixTree().save(tmp_path / 'empty.a2pt')
+    with FrozenPrefixTree.load(tmp_path / 'empty.a2pt') as loaded:
+        assert loaded.autocomplete([]) == []
+
+    (tmp_path / 'bad.a2pt').write_bytes(b'not a prefix tree' * 4)
+    with pytest.raises(ValueError):
+        FrozenPrefixTree.load(tmp_path / 'bad.a2pt')
+
+
+def test_saved_melody_tree_loads(tmp_path, monkeypatch) -> None:
+    """Test that a tree of melodies saved with a MelodyCodec loads with the
+    same melodies without unpickling anything, and can only be loaded with a
+    MelodyCodec.
+    """
+    engine = MelodyAutocompleteEngine({
+        'file': 'data/melodies/songbook.csv',
+        'autocompleter': 'compressed'
+    })
+    engine.autocompleter.save(tmp_path / 'songbook.a2pt', MelodyCodec())
+    monkeypatch.setattr(pickle, 'loads', None)
+    with FrozenPrefixTree.load(tmp_path / 'songbook.a2pt', MelodyCodec()) as loaded:
+        actual = loaded.autocomplete([])
+        assert [(melody.name, weight) for melody, weight
+                in loaded.autocomplete([1, 2, 2, -2], 1)] == [('Danny Boy', 1.0)]
+
+    expected = engine.autocompleter.freeze().autocomplete([])
+    assert len(actual) == len(expected) == 25
+    assert [(melody.name, melody.notes, weight) for melody, weight in actual] == \
+        [(melody.name, melody.notes, weight) for melody, weight in expected]
+
+    monkeypatch.undo()
+    with pytest.raises(ValueError):
+        FrozenPrefixTree.load(tmp_path / 'songbook.a2pt')
+
+    t = SimplePrefixTree()
+    t.insert(Melody('long', [(60, 70000)]), 1.0, [])
+    with pytest.raises(ValueError):
+        t.save(tmp_path / 'long.a2pt', MelodyCodec())
+
+
+###########################################################################
+# Contract checking switch
+###########################################################################
+def test_contract_checking_can_be_turned_off() -> None:
+    """Test that setting A2_CHECK_CONTRACTS=0 turns off contract checking,
+    which is otherwise on (so a weight of 0 violates insert's precondition).
+    """
+    code = ('from a2_prefix_tree import SimplePrefixTree\n'
+            'SimplePrefixTree().insert("a", 0.0, ["a"])\n')
+    checked = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                             env={**os.environ, 'A2_CHECK_CONTRACTS': '1'}, check=False)
+    assert checked.returncode != 0
+    assert b'AssertionError' in checked.stderr
+
+    unchecked = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                               env={**os.environ, 'A2_CHECK_CONTRACTS': '0'}, check=False)
+    assert unchecked.returncode == 0
+
 
 if __name__ == '__main__':
-    import pytest
     pytest.main(['a2_sample_test.py'])